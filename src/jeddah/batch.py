@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from shapely import vectorized, wkt
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+import typer
+
+from jeddah.cli import exit_on_spent_budget, exit_on_uncached_tiles, log_run_stats
+from jeddah.cost_estimate import cost_estimate_lines, estimate_project_cost
+from jeddah.create_path import EARTH_RADIUS_IN_KILOMETERS, distances_to_point
+from jeddah.database_config import Database
+from jeddah.pipeline import collect_paths_images
+from jeddah.point import Point
+from jeddah.point_array import PointArray
+from jeddah.request_daedal import (
+    RADIUS_MARGIN,
+    create_polygon,
+    iter_completed_paths,
+    request_tiled_road_network,
+)
+from jeddah.road_graph import RoadGraph
+from jeddah.road_network import BoolArray, RoadNetwork
+from jeddah.spatial_index import SpatialIndex, deduplicate_paths
+from settings.settings import settings
+
+
+Cell = Tuple[int, int]
+# road chains of a cell, with their key in the project
+CellChains = List[Tuple[str, PointArray]]
+
+app = typer.Typer()
+
+
+class Circle(NamedTuple):
+    center: Point
+    radius: int
+
+
+def circles_polygon(circles: Sequence[Circle]) -> Polygon:
+    """
+    :return: union of the bounding boxes of the circles
+    """
+    return unary_union(
+        [
+            create_polygon(circle.center, circle.radius + RADIUS_MARGIN)
+            for circle in circles
+        ]
+    )
+
+
+def circles_node_mask(network: RoadNetwork, circles: Sequence[Circle]) -> BoolArray:
+    """
+    :return: True for the nodes within the radius of at least one circle
+    """
+    node_mask = np.zeros(len(network.node_ids), dtype=bool)
+    for circle in circles:
+        distances = distances_to_point(
+            network.latitudes, network.longitudes, circle.center
+        )
+        node_mask |= distances < circle.radius + RADIUS_MARGIN
+    return node_mask
+
+
+def polygon_node_mask(network: RoadNetwork, polygon: Polygon) -> BoolArray:
+    """
+    :param polygon: in (longitude, latitude) coordinates
+    :return: True for the nodes inside the polygon
+    """
+    node_mask: BoolArray = vectorized.contains(
+        polygon, network.longitudes, network.latitudes
+    )
+    return node_mask
+
+
+def split_into_cells(
+    chains: Dict[str, PointArray], cell_size: float, reference_latitude: float
+) -> Dict[Cell, CellChains]:
+    """
+    Tiles the area into square cells, cell_size meters wide, and gives every chain to
+    the cell of its first point, so that cells never share a chain
+
+    :return: chains of every cell, cells sorted from south-west to north-east
+    """
+    meters_per_degree = EARTH_RADIUS_IN_KILOMETERS * 1000 * math.pi / 180
+    longitude_scale = math.cos(math.radians(reference_latitude))
+
+    cells: Dict[Cell, CellChains] = dict()
+    for path_key, chain in chains.items():
+        if len(chain) == 0:
+            continue
+        first_point = chain[0]
+        cell = (
+            math.floor(
+                first_point.longitude * meters_per_degree * longitude_scale / cell_size
+            ),
+            math.floor(first_point.latitude * meters_per_degree / cell_size),
+        )
+        cells.setdefault(cell, []).append((path_key, chain))
+
+    return {
+        cell: cells[cell] for cell in sorted(cells, key=lambda cell: (cell[1], cell[0]))
+    }
+
+
+def area_cells(
+    circles: Sequence[Circle] = (),
+    polygon: Optional[Polygon] = None,
+    offline: bool = False,
+) -> Dict[Cell, CellChains]:
+    """
+    Loads the road network of an area made of several circles, or of a polygon, once,
+    and splits its chains into cells of settings.batch_cell_size meters
+
+    :param offline: only use the road tile cache, see request_tiled_road_network
+    """
+    if polygon is None:
+        area = circles_polygon(circles)
+    else:
+        area = polygon
+    network = request_tiled_road_network(area, offline=offline)
+    if polygon is None:
+        node_mask = circles_node_mask(network, circles)
+    else:
+        node_mask = polygon_node_mask(network, polygon)
+
+    chains = RoadGraph.from_network(network, node_mask).chain_paths()
+    return split_into_cells(chains, settings.batch_cell_size, area.centroid.y)
+
+
+def run_batch(
+    project_name: str,
+    database: Database,
+    project_directory: Path,
+    threshold: int,
+    circles: Sequence[Circle] = (),
+    polygon: Optional[Polygon] = None,
+    workers: Optional[int] = None,
+) -> SpatialIndex:
+    """
+    Collects the images of an area made of several circles, or of a polygon. The road
+    network of the whole area is loaded once and its chains are split into cells.
+    Chains are sampled and deduplicated with a single index, cell after cell in the
+    cells order, so that a batch run again keeps the same points. Cells are then
+    collected concurrently, each one in its own directory.
+
+    :param workers: cells collected at once, defaults to settings.batch_cell_workers
+    :return: the deduplication index, once every cell is collected
+    """
+    if workers is None:
+        workers = settings.batch_cell_workers
+
+    cells = area_cells(circles, polygon)
+    spatial_index = SpatialIndex(threshold)
+    cell_of_chain = {
+        path_key: cell
+        for cell, cell_chains in cells.items()
+        for path_key, _ in cell_chains
+    }
+    chains = (chain for cell_chains in cells.values() for chain in cell_chains)
+    cell_paths: Dict[Cell, CellChains] = {cell: [] for cell in cells}
+    completed_paths = iter_completed_paths(chains, threshold)
+    for path_key, path in deduplicate_paths(completed_paths, threshold, spatial_index):
+        cell_paths[cell_of_chain[path_key]].append((path_key, path))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                collect_paths_images,
+                project_name,
+                paths,
+                database,
+                project_directory / f"cell_{cell[0]}_{cell[1]}",
+            )
+            for cell, paths in cell_paths.items()
+        ]
+        # consuming the results re-raises any exception from a cell
+        for future in futures:
+            future.result()
+
+    return spatial_index
+
+
+def parse_circle(circle: str) -> Circle:
+    """
+    :param circle: "latitude,longitude,radius"
+    """
+    latitude, longitude, radius = circle.split(",")
+    return Circle(Point(float(latitude), float(longitude)), int(radius))
+
+
+@app.command()
+def batch(
+    project_name: str,
+    circle: List[str] = typer.Option([], help="latitude,longitude,radius"),
+    polygon: Optional[str] = typer.Option(None, help="WKT, in longitude latitude"),
+    threshold: int = 10,
+    dry_run: bool = typer.Option(
+        False, help="Estimate the requests from the cached road network, send none"
+    ),
+) -> None:
+    if (len(circle) == 0) == (polygon is None):
+        raise typer.BadParameter("Give either circles or a polygon")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    circles = [parse_circle(one_circle) for one_circle in circle]
+    area_polygon = None if polygon is None else wkt.loads(polygon)
+
+    if dry_run:
+        with exit_on_uncached_tiles():
+            cells = area_cells(circles, area_polygon, offline=True)
+        estimate = estimate_project_cost(
+            (chain for cell_chains in cells.values() for chain in cell_chains), threshold
+        )
+        for line in cost_estimate_lines(estimate):
+            typer.echo(line)
+        return
+
+    database = Database()
+    database.setup()
+    project_directory = settings.database_directory / project_name
+    project_directory.mkdir(parents=True, exist_ok=True)
+
+    with exit_on_spent_budget():
+        spatial_index = run_batch(
+            project_name,
+            database,
+            project_directory,
+            threshold,
+            circles=circles,
+            polygon=area_polygon,
+        )
+    typer.echo(
+        f"{spatial_index.kept} points kept, "
+        f"{spatial_index.dropped} duplicate points removed across paths, "
+        f"{spatial_index.requests_saved} requests saved"
+    )
+    log_run_stats()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import typer
+
+from jeddah import http_client
+from jeddah.image_cache import log_image_cache_stats
+from jeddah.request_scheduler import RequestBudgetExceeded
+
+
+def report_error(message: str) -> None:
+    typer.secho("Error: " + message, fg=typer.colors.RED, err=True)
+
+
+def log_run_stats() -> None:
+    """
+    Logs what a run sent to Google, over how many connections, and what it found in
+    the image cache
+    """
+    http_client.log_request_metrics()
+    http_client.log_connection_stats()
+    log_image_cache_stats()
+
+
+@contextmanager
+def exit_on_spent_budget() -> Iterator[None]:
+    """
+    Stops the command with an error once the request budget is spent. Downloaded images
+    are checkpointed, running the command again resumes it.
+    """
+    try:
+        yield
+    except RequestBudgetExceeded as e:
+        report_error(str(e))
+        log_run_stats()
+        raise typer.Exit(code=1)
+
+
+@contextmanager
+def exit_on_uncached_tiles() -> Iterator[None]:
+    """
+    Stops a dry run with an error when the road network of a tile is not cached
+    """
+    try:
+        yield
+    except FileNotFoundError as e:
+        report_error(f"road tiles not cached, run once online ({e})")
+        raise typer.Exit(code=1)
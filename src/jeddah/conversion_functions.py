@@ -1,9 +1,11 @@
-from typing import Any, List
+from typing import Any, Tuple
 
-from jeddah.point import Point
+import numpy as np
 
+from jeddah.point_array import FloatArray, PathLike, PointArray
 
-def coords_as_path_str(path: List[Point]) -> str:
+
+def coords_as_path_str(path: PathLike) -> str:
     """
     Turns a list of points" coordinates into the string format required by the Roads API.
     """
@@ -11,31 +13,48 @@ def coords_as_path_str(path: List[Point]) -> str:
     return "|".join([str(point) for point in path])
 
 
-def json_as_path(json_path: Any) -> List[Point]:
+def json_as_path(json_path: Any) -> PointArray:
     """
     Turns the json format returned by the Roads API and turns it into a list of points
     """
 
-    path = [
-        Point(
-            snapped_point["location"]["latitude"],
-            snapped_point["location"]["longitude"],
-        )
-        for snapped_point in json_path["snappedPoints"]
-    ]
+    snapped_points = json_path["snappedPoints"]
+    path = PointArray(
+        [snapped_point["location"]["latitude"] for snapped_point in snapped_points],
+        [snapped_point["location"]["longitude"] for snapped_point in snapped_points],
+    )
 
     return path
 
 
-def create_path(path_str: str) -> List[Point]:
+def create_path(path_str: str) -> PointArray:
     """
-    Converts a certain path into a list of Point objects
+    Converts a certain path into a PointArray
     """
-    path = []
+    latitudes, longitudes = [], []
     split_path = path_str.split("|")
     for point in split_path:
         split_point = point.split(",")
-        new_point = Point(float(split_point[0]), float(split_point[1]))
-        path.append(new_point)
+        latitudes.append(float(split_point[0]))
+        longitudes.append(float(split_point[1]))
 
-    return path
+    return PointArray(latitudes, longitudes)
+
+
+def coords_as_arrays(path: PathLike) -> Tuple[FloatArray, FloatArray]:
+    """
+    Splits a path into two float64 arrays: latitudes and longitudes. A PointArray's own
+     arrays are returned without copy.
+    """
+
+    if isinstance(path, PointArray):
+        return path.latitudes, path.longitudes
+
+    latitudes = np.fromiter(
+        (point.latitude for point in path), dtype=np.float64, count=len(path)
+    )
+    longitudes = np.fromiter(
+        (point.longitude for point in path), dtype=np.float64, count=len(path)
+    )
+
+    return latitudes, longitudes
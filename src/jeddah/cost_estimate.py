@@ -0,0 +1,104 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from jeddah.http_client import endpoint_rates
+from jeddah.point_array import PathLike
+from jeddah.request_daedal import iter_completed_paths
+from jeddah.spatial_index import REQUESTS_PER_POINT, SpatialIndex, deduplicate_paths
+from settings.settings import settings
+
+
+# side images of a sample point, the other request of the point being its metadata
+IMAGES_PER_POINT = REQUESTS_PER_POINT - 1
+
+
+class CostEstimate(NamedTuple):
+    paths: int
+    points: int
+    # projected requests per endpoint
+    requests: Dict[str, int]
+    # projected duration of the run, in seconds
+    seconds: float
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+
+def endpoint_workers() -> Dict[str, int]:
+    """
+    :return: requests in flight at once on every endpoint during a run
+    """
+    return {
+        "street_view": settings.image_download_workers,
+        "street_view_metadata": settings.pipeline_planning_workers,
+        "static_maps": settings.pipeline_planning_workers,
+        "roads": settings.snap_workers,
+    }
+
+
+def estimate_seconds(requests: Dict[str, int]) -> float:
+    """
+    Each endpoint is limited by its rate, or by its workers waiting
+    settings.estimated_request_seconds for every response. Endpoints are requested
+    by overlapping stages of the pipeline, so the slowest one sets the duration.
+    """
+    rates = endpoint_rates()
+    workers = endpoint_workers()
+    seconds = 0.0
+    for endpoint, request_count in requests.items():
+        throughput = min(
+            rates[endpoint], workers[endpoint] / settings.estimated_request_seconds
+        )
+        seconds = max(seconds, request_count / throughput)
+    return seconds
+
+
+def estimate_project_cost(
+    chains: Iterable[Tuple[str, PathLike]],
+    threshold: int,
+    spatial_index: Optional[SpatialIndex] = None,
+) -> CostEstimate:
+    """
+    Samples and deduplicates the road chains like collect_project_images, without
+    sending any request, and counts the requests the project would send. Images are
+    counted for every point: points sharing a panorama are only known once their
+    metadata is requested, so the count of images is an upper bound.
+
+    :param spatial_index: index of the points kept so far, shared between calls to
+        estimate several areas together
+    """
+    if spatial_index is None:
+        spatial_index = SpatialIndex(threshold)
+
+    paths = 0
+    points = 0
+    completed_paths = iter_completed_paths(chains, threshold)
+    for _, path in deduplicate_paths(completed_paths, threshold, spatial_index):
+        paths += 1
+        points += len(path)
+
+    requests = {
+        "street_view_metadata": points,
+        "street_view": IMAGES_PER_POINT * points,
+        # one map of every path
+        "static_maps": paths,
+        # chains come from the road network, they are not snapped
+        "roads": 0,
+    }
+    return CostEstimate(paths, points, requests, estimate_seconds(requests))
+
+
+def cost_estimate_lines(estimate: CostEstimate) -> List[str]:
+    """
+    :return: lines describing the estimate, to show before a run
+    """
+    lines = [f"{estimate.paths} paths, {estimate.points} points"]
+    for endpoint, request_count in estimate.requests.items():
+        lines.append(f"{endpoint}: {request_count} requests")
+    lines.append(
+        f"{estimate.total_requests} requests in total, "
+        f"about {estimate.seconds / 60:.1f} minutes"
+    )
+    if settings.request_budget is not None:
+        lines.append(f"request budget: {settings.request_budget}")
+    return lines
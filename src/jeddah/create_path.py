@@ -1,11 +1,14 @@
 import math
-from typing import List, Tuple
+from typing import Tuple, Union
 
+import numpy as np
+import numpy.typing as npt
 import pyproj
-import requests
 
-from jeddah.conversion_functions import coords_as_path_str, create_path, json_as_path
+from jeddah.conversion_functions import coords_as_arrays, create_path
 from jeddah.point import Point
+from jeddah.point_array import FloatArray, PathLike, PointArray, as_point_array
+from jeddah.road_snapping import get_snap_cache, snap_path
 from settings.settings import settings
 
 
@@ -17,116 +20,148 @@ MAPS_BASE = settings.maps_base
 
 # GLOBAL VARIABLES
 EARTH_RADIUS_IN_KILOMETERS = 6378
+# geodesic computations are all made on the same ellipsoid, built once
+GEODESIC = pyproj.Geod(ellps="WGS84")
+
+Coordinates = Union[float, FloatArray]
 API_KEY = settings.api_key.get_secret_value()
 
 
-def snap_to_road_and_interpolate(point_list: List[Point]) -> List[Point]:
+def snap_to_road_and_interpolate(point_list: PathLike) -> PointArray:
     """
-    Snaps a list of points to the nearest Road using Google"s Roads API, and can add new
-     points in between the ones in the given list if interpolation_boolean set to "true"
+    Snaps a list of points to the nearest Road using Google"s Roads API, and adds new
+     points in between the ones in the given list. Paths longer than the API limit are
+     snapped by overlapping windows.
 
     """
-    # request to Roads API requires the path to be a certain string format
-    coords_as_path_for_api = coords_as_path_str(point_list)
+    return snap_path(point_list, snap_cache=get_snap_cache())
+
 
-    params = {
-        "key": API_KEY,
-        "path": coords_as_path_for_api,
-        "interpolate": "true",
-    }
-    # requesting the Roads API
-    try:
-        response = requests.get(ROADS_BASE, params=params)
-        json_path = response.json()
+def compute_distance_with_haversine(point_1: Point, point_2: Point) -> float:
+    """
+    Calculates the distance, in meters, between two points using their coordinates and
+    haversine formula
+    """
 
-        # turn the json response into a list
-        point_list = json_as_path(json_path)
-    except requests.exceptions.HTTPError as e:
-        print("Error: " + str(e))
+    distance_in_meters = haversine_distances(
+        point_1.latitude, point_1.longitude, point_2.latitude, point_2.longitude
+    )
 
-    return point_list
+    return float(distance_in_meters)
 
 
-def filling_missing_points(point_list: List[Point], threshold: int) -> List[Point]:
+def haversine_distances(
+    latitudes_1: Coordinates,
+    longitudes_1: Coordinates,
+    latitudes_2: Coordinates,
+    longitudes_2: Coordinates,
+) -> FloatArray:
     """
-    Fills the input list with new points if some are too far apart from each other
-
-    :param threshold: Minimum distance that should separate 2 points
+    Calculates, in one vectorized pass, the distances in meters between two sets of
+    coordinates. Inputs are broadcast against each other like any numpy operation.
     """
 
-    points_list_filled = []
+    lat1_radians = np.radians(latitudes_1)
+    lat2_radians = np.radians(latitudes_2)
 
-    for index in range(0, len(point_list) - 1):
+    delta_lat = np.radians(np.subtract(latitudes_2, latitudes_1))
+    delta_lng = np.radians(np.subtract(longitudes_2, longitudes_1))
 
-        distance_from_next_point = compute_distance_with_haversine(
-            point_list[index], point_list[index + 1]
-        )
-        if distance_from_next_point > threshold:
-            # the interpolate_points functions adds points between the two current ones
-            interpolated_points = interpolate_points(
-                point_list[index], point_list[index + 1], threshold
-            )
-            points_list_filled.append(point_list[index])
+    haversine_delta_lat = np.sin(delta_lat / 2) ** 2
+    haversine_delta_lng = np.sin(delta_lng / 2) ** 2
 
-            # adding all the interpolated points to our list
-            for interpolated_point in interpolated_points:
-                points_list_filled.append(interpolated_point)
+    haversine_central_angle = (
+        haversine_delta_lat
+        + np.cos(lat1_radians) * np.cos(lat2_radians) * haversine_delta_lng
+    )
+    spherical_distance = 2 * np.arctan2(
+        np.sqrt(haversine_central_angle), np.sqrt(1 - haversine_central_angle)
+    )
+    kilo = 1000
+    distances_in_meters = EARTH_RADIUS_IN_KILOMETERS * kilo * spherical_distance
 
-        else:
-            points_list_filled.append(point_list[index])
+    return np.asarray(distances_in_meters, dtype=np.float64)
 
-    points_list_filled.append(point_list[-1])
 
-    return points_list_filled
+def consecutive_distances(latitudes: FloatArray, longitudes: FloatArray) -> FloatArray:
+    """
+    Returns the distances, in meters, between each point of a path and the next one.
+    The result has one element less than the path.
+    """
 
+    return haversine_distances(
+        latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]
+    )
 
-def compute_distance_with_haversine(point_1: Point, point_2: Point) -> float:
+
+def distances_to_point(
+    latitudes: FloatArray, longitudes: FloatArray, point: Point
+) -> FloatArray:
     """
-    Calculates the distance, in meters, between two points using their coordinates and
-    haversine formula
+    Returns the distances, in meters, between every given coordinate and a single point
     """
 
-    lat1, lng1 = point_1.latitude, point_1.longitude
-    lat2, lng2 = point_2.latitude, point_2.longitude
-
-    lat1_radians = math.radians(lat1)
-    lat2_radians = math.radians(lat2)
+    return haversine_distances(latitudes, longitudes, point.latitude, point.longitude)
 
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
 
-    haversine_delta_lat = math.sin(delta_lat / 2) ** 2
-    haversine_delta_lng = math.sin(delta_lng / 2) ** 2
+def pairwise_distances(
+    latitudes_1: FloatArray,
+    longitudes_1: FloatArray,
+    latitudes_2: FloatArray,
+    longitudes_2: FloatArray,
+) -> FloatArray:
+    """
+    Returns the matrix of distances, in meters, between every point of the first set
+    (rows) and every point of the second set (columns)
+    """
 
-    haversine_central_angle = (
-        haversine_delta_lat
-        + math.cos(lat1_radians) * math.cos(lat2_radians) * haversine_delta_lng
-    )
-    spherical_distance = 2 * math.atan2(
-        math.sqrt(haversine_central_angle), math.sqrt(1 - haversine_central_angle)
+    return haversine_distances(
+        latitudes_1[:, np.newaxis],
+        longitudes_1[:, np.newaxis],
+        latitudes_2[np.newaxis, :],
+        longitudes_2[np.newaxis, :],
     )
-    kilo = 1000
-    distance_in_meters = EARTH_RADIUS_IN_KILOMETERS * kilo * spherical_distance
 
-    return distance_in_meters
 
-
-def interpolate_points(point_1: Point, point_2: Point, threshold: int) -> List[Point]:
+def great_circle_points(
+    latitudes_1: FloatArray,
+    longitudes_1: FloatArray,
+    latitudes_2: FloatArray,
+    longitudes_2: FloatArray,
+    fractions: FloatArray,
+) -> Tuple[FloatArray, FloatArray]:
     """
-    Used when two points are too far apart from each other. Will create new points between
-     them, separated by the given threshold distance.
+    Returns the points located at the given fractions of the great circle arcs going
+     from the first coordinates to the second ones. A fraction of 0 returns the start
+     point unchanged.
     """
 
-    current_point = point_1
-    added_points = [current_point]
-
-    while compute_distance_with_haversine(current_point, point_2) > threshold:
-        heading = get_heading(current_point, point_2)
-        created_point = make_a_step_and_snap(heading, current_point, threshold)
-        current_point = created_point
-        added_points.append(current_point)
+    lat1, lng1 = np.radians(latitudes_1), np.radians(longitudes_1)
+    lat2, lng2 = np.radians(latitudes_2), np.radians(longitudes_2)
+    start_vectors = np.stack(
+        [np.cos(lat1) * np.cos(lng1), np.cos(lat1) * np.sin(lng1), np.sin(lat1)]
+    )
+    end_vectors = np.stack(
+        [np.cos(lat2) * np.cos(lng2), np.cos(lat2) * np.sin(lng2), np.sin(lat2)]
+    )
 
-    return added_points
+    central_angles = haversine_distances(
+        latitudes_1, longitudes_1, latitudes_2, longitudes_2
+    ) / (EARTH_RADIUS_IN_KILOMETERS * 1000)
+    sin_central_angles = np.sin(central_angles)
+    moving = (fractions > 0) & (sin_central_angles > 0)
+    safe_sin = np.where(moving, sin_central_angles, 1)
+    start_weights = np.sin((1 - fractions) * central_angles) / safe_sin
+    end_weights = np.sin(fractions * central_angles) / safe_sin
+
+    vectors = start_weights * start_vectors + end_weights * end_vectors
+    new_latitudes = np.degrees(np.arctan2(vectors[2], np.hypot(vectors[0], vectors[1])))
+    new_longitudes = np.degrees(np.arctan2(vectors[1], vectors[0]))
+
+    return (
+        np.where(moving, new_latitudes, latitudes_1),
+        np.where(moving, new_longitudes, longitudes_1),
+    )
 
 
 def get_heading(point_1: Point, point_2: Point) -> int:
@@ -135,15 +170,34 @@ def get_heading(point_1: Point, point_2: Point) -> int:
     north)  between two points
     """
 
-    geodesic = pyproj.Geod(ellps="WGS84")
     lat1, long1 = point_1.latitude, point_1.longitude
     lat2, long2 = point_2.latitude, point_2.longitude
-    fwd_azimuth, _, _ = geodesic.inv(long1, lat1, long2, lat2)
+    fwd_azimuth, _, _ = GEODESIC.inv(long1, lat1, long2, lat2)
     if int(fwd_azimuth) < 0:
         fwd_azimuth += 360
     return int(fwd_azimuth)
 
 
+def get_headings(path: PathLike) -> npt.NDArray[np.int_]:
+    """
+    Calculates, in a single call, the azimuth of every point of a path towards the next
+    one. The last point gets the azimuth towards itself, so there is one heading per
+    point.
+    """
+
+    latitudes, longitudes = coords_as_arrays(path)
+    next_indexes = np.minimum(np.arange(1, len(latitudes) + 1), len(latitudes) - 1)
+    fwd_azimuths, _, _ = GEODESIC.inv(
+        longitudes, latitudes, longitudes[next_indexes], latitudes[next_indexes]
+    )
+    fwd_azimuths = np.asarray(fwd_azimuths)
+    # same rounding as get_heading: truncated, then brought back into [0, 360[
+    truncated_azimuths = np.trunc(fwd_azimuths)
+    fwd_azimuths = np.where(truncated_azimuths < 0, fwd_azimuths + 360, fwd_azimuths)
+    headings: npt.NDArray[np.int_] = np.trunc(fwd_azimuths).astype(np.int_)
+    return headings
+
+
 def make_a_step_and_snap(heading: int, current_point: Point, distance: int) -> Point:
     """
     Make a step of a certain distance in the given direction (heading), creates a point
@@ -176,37 +230,57 @@ def get_delta_shift(heading: int, distance: int) -> Tuple[float, float]:
     return x_variation, y_variation
 
 
-def prune_point_list_with_threshold(
-    point_list: List[Point], threshold: int
-) -> List[Point]:
+def resample_path(path: PathLike, threshold: float) -> PointArray:
     """
-    Returns a list containing the points that are at least separated by the distance
-     defined by the threshold
+    Fills and prunes a path in a single pass: points are placed along the path every
+     threshold meters of arc length, starting at its first point, without building the
+     densified path first
+
+    :return: Points exactly threshold meters apart along the path
     """
-    current_point = point_list[0]
-    point_list_with_threshold = [current_point]
 
-    for point in point_list:
-        distance = compute_distance_with_haversine(current_point, point)
+    path = as_point_array(path)
+    if len(path) < 2:
+        return path[:1]
 
-        if distance > threshold:
-            point_list_with_threshold.append(point)
-            current_point = point
+    latitudes, longitudes = coords_as_arrays(path)
+    segment_lengths = consecutive_distances(latitudes, longitudes)
+    cumulative_lengths = np.concatenate([[0], np.cumsum(segment_lengths)])
 
-    return point_list_with_threshold
+    point_count = int(cumulative_lengths[-1] // threshold) + 1
+    arc_lengths = np.arange(point_count) * threshold
+    segment_indexes = np.minimum(
+        np.searchsorted(cumulative_lengths, arc_lengths, side="right") - 1,
+        len(segment_lengths) - 1,
+    )
+    lengths = segment_lengths[segment_indexes]
+    fractions = np.divide(
+        arc_lengths - cumulative_lengths[segment_indexes],
+        lengths,
+        out=np.zeros(point_count),
+        where=lengths > 0,
+    )
+
+    return PointArray(
+        *great_circle_points(
+            latitudes[segment_indexes],
+            longitudes[segment_indexes],
+            latitudes[segment_indexes + 1],
+            longitudes[segment_indexes + 1],
+            fractions,
+        )
+    )
 
 
-def process_path(path: List[Point], threshold: int = 10) -> List[Point]:
+def process_path(path: PathLike, threshold: int = 10) -> PointArray:
     """
-    :return: List of points fully processed, with points evenly separated
+    :return: Path fully processed, with points evenly separated
     """
 
-    point_list_filled = filling_missing_points(path, threshold)
-    point_list_pruned = prune_point_list_with_threshold(point_list_filled, threshold)
-    return point_list_pruned
+    return resample_path(path, threshold)
 
 
-def path_str_pre_process(path: str) -> List[Point]:
+def path_str_pre_process(path: str) -> PathLike:
     point_list = create_path(path)
     point_list_snapped = snap_to_road_and_interpolate(point_list)
     return point_list_snapped
@@ -1,16 +1,24 @@
-from typing import Any, List
+from contextlib import contextmanager
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 from sqlalchemy import (
+    Boolean,
     Column,
     Float,
     ForeignKey,
     Integer,
     Sequence,
     String,
+    Table,
     create_engine,
+    func,
+    select,
+    text,
 )
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import close_all_sessions, relationship, sessionmaker
+from sqlalchemy.orm import Session, close_all_sessions, relationship, sessionmaker
 from sqlalchemy_utils import create_database, database_exists
 
 from settings.settings import settings
@@ -18,6 +26,33 @@ from settings.settings import settings
 
 Base = declarative_base()
 
+# maximum number of rows sent in a single multi-row INSERT
+INSERT_BATCH_SIZE = 1000
+
+Row = Dict[str, Any]
+# a path row, its point rows, and for every point its image rows
+PathRows = Tuple[Row, List[Row], List[List[Row]]]
+
+
+class PendingImage(NamedTuple):
+    latitude: float
+    longitude: float
+    heading: int
+    img_path: str
+
+
+class PathProgress(NamedTuple):
+    id_path: int
+    completed: bool
+    # images of the path not downloaded yet, one per image file
+    pending_images: List[PendingImage]
+
+
+# engines and session factories are shared by every Database of the process
+_engines: Dict[str, Engine] = dict()
+_session_factories: Dict[str, "sessionmaker[Session]"] = dict()
+_engines_lock = threading.Lock()
+
 
 class Image(Base):
     __tablename__ = "images"
@@ -25,6 +60,7 @@ class Image(Base):
     id_point = Column(Integer, ForeignKey("points.id_point"))
     img_path = Column(String)
     heading = Column(Integer)
+    downloaded = Column(Boolean, default=False)  # False until the file is written
 
     def __repr__(self) -> str:
         return (
@@ -40,6 +76,7 @@ class PointForDatabase(Base):
     path_index = Column(Integer)  # order in the path
     latitude = Column(Float)
     longitude = Column(Float)
+    pano_id = Column(String)  # Street View panorama, None if no imagery
     # defining 1 to 2 relationship
     image_relation: List[Image] = relationship(
         "Image",
@@ -53,7 +90,7 @@ class PointForDatabase(Base):
         return (
             f"<PointForDatabase(id_point={self.id_point}, id_of_path={self.id_path},"
             f" path_index={self.path_index}, latitude={self.latitude}, "
-            f"longitude={ self.longitude})>"
+            f"longitude={ self.longitude}, pano_id={self.pano_id})>"
         )
 
 
@@ -65,6 +102,8 @@ class PathForDatabase(Base):
     street = Column(String)
     city = Column(String)
     country = Column(String)
+    path_key = Column(String)  # identifies the path within its project
+    completed = Column(Boolean, default=False)  # True once all its images are written
     # 1 to n relationship
     path_relation: List[PointForDatabase] = relationship(
         "PointForDatabase",
@@ -82,6 +121,39 @@ class PathForDatabase(Base):
         )
 
 
+# columns added after their table was first released: create_all leaves existing
+# tables as they are, so setup adds them. Rows written before keep NULL.
+ADDED_COLUMNS = [
+    PathForDatabase.__table__.c.path_key,
+    PathForDatabase.__table__.c.completed,
+    PointForDatabase.__table__.c.pano_id,
+    Image.__table__.c.downloaded,
+]
+
+
+def get_engine(url: str) -> Engine:
+    """
+    Returns the engine of the process for this url, created on first call with the
+    pool and logging settings
+    """
+    with _engines_lock:
+        if url not in _engines:
+            _engines[url] = create_engine(
+                url,
+                echo=settings.database_echo,
+                pool_size=settings.database_pool_size,
+                max_overflow=settings.database_max_overflow,
+                pool_pre_ping=settings.database_pool_pre_ping,
+            )
+            _session_factories[url] = sessionmaker(_engines[url])
+        return _engines[url]
+
+
+def get_session_factory(url: str) -> "sessionmaker[Session]":
+    get_engine(url)
+    return _session_factories[url]
+
+
 class Database:
     def __init__(self, db_name: str = "street_view_db") -> None:
         db_host = settings.postgresql_hostname
@@ -89,7 +161,8 @@ class Database:
         self.url = (
             f"postgresql+psycopg2://postgres:postgres@{db_host}:{db_port}/{db_name}"
         )
-        self.engine = create_engine(self.url, echo=True)
+        self.engine = get_engine(self.url)
+        self.session_factory = get_session_factory(self.url)
 
     def setup(self) -> Any:
 
@@ -102,18 +175,203 @@ class Database:
         PointForDatabase.__table__.create(bind=self.engine, checkfirst=True)
         PathForDatabase.__table__.create(bind=self.engine, checkfirst=True)
 
+        with self.engine.begin() as connection:
+            for column in ADDED_COLUMNS:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {column.table.name} "
+                        f"ADD COLUMN IF NOT EXISTS {column.name} {column_type}"
+                    )
+                )
+
         return self.engine
 
-    def save(self, object_to_save: Base) -> None:  # changed from Any to Base, workin ?
-        Session = sessionmaker(self.engine)
-        session = Session()
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """
+        Unit of work: commits when the block ends, rolls back if it raises
+        """
+        session = self.session_factory()
         try:
-            session.add(object_to_save)
+            yield session
             session.commit()
+        except Exception:
+            session.rollback()
+            raise
         finally:
             session.close()
 
+    def save(self, object_to_save: Base) -> None:  # changed from Any to Base, workin ?
+        with self.session_scope() as session:
+            session.add(object_to_save)
+
+    def ingest_paths(self, paths: List[PathRows]) -> List[int]:
+        """
+        Writes paths with their points and images using multi-row INSERTs, all in a
+        single transaction. Rows are plain dicts of column values, foreign keys are
+        filled in from the ids reserved for the parent rows.
+
+        :return: generated id of every path, in the given order
+        """
+        with self.engine.begin() as connection:
+            path_ids = insert_with_ids(
+                connection,
+                PathForDatabase.__table__,
+                [path_row for path_row, _, _ in paths],
+            )
+
+            point_rows = []
+            image_rows_per_point = []
+            for path_id, (_, path_point_rows, path_image_rows) in zip(path_ids, paths):
+                for point_row in path_point_rows:
+                    point_rows.append({**point_row, "id_path": path_id})
+                image_rows_per_point.extend(path_image_rows)
+            point_ids = insert_with_ids(
+                connection, PointForDatabase.__table__, point_rows
+            )
+
+            image_rows = [
+                {**image_row, "id_point": point_id}
+                for point_id, image_rows in zip(point_ids, image_rows_per_point)
+                for image_row in image_rows
+            ]
+            bulk_insert(connection, Image.__table__, image_rows)
+
+        return path_ids
+
+    def ingest_path(
+        self, path_row: Row, point_rows: List[Row], image_rows_per_point: List[List[Row]]
+    ) -> int:
+        """
+        Writes a single path, see ingest_paths
+        """
+        return self.ingest_paths([(path_row, point_rows, image_rows_per_point)])[0]
+
+    def completed_path_keys(self, name: str) -> Set[str]:
+        """
+        :return: keys of the completed paths of a project
+        """
+        with self.session_scope() as session:
+            rows = session.query(PathForDatabase.path_key).filter(
+                PathForDatabase.name == name, PathForDatabase.completed.is_(True)
+            )
+            return {path_key for path_key, in rows}
+
+    def path_progress(self, name: str, path_key: str) -> Optional[PathProgress]:
+        """
+        :return: progress of the path of a project, None if it was never started
+        """
+        with self.session_scope() as session:
+            path = (
+                session.query(PathForDatabase.id_path, PathForDatabase.completed)
+                .filter(
+                    PathForDatabase.name == name, PathForDatabase.path_key == path_key
+                )
+                .order_by(PathForDatabase.id_path)
+                .first()
+            )
+            if path is None:
+                return None
+
+            rows = (
+                session.query(
+                    PointForDatabase.latitude,
+                    PointForDatabase.longitude,
+                    Image.heading,
+                    Image.img_path,
+                )
+                .join(Image, Image.id_point == PointForDatabase.id_point)
+                .filter(
+                    PointForDatabase.id_path == path.id_path,
+                    Image.downloaded.is_(False),
+                )
+                .order_by(Image.id)
+            )
+            # images shared by several points are downloaded once
+            pending_images: Dict[str, PendingImage] = dict()
+            for row in rows:
+                pending_images.setdefault(row.img_path, PendingImage(*row))
+
+            return PathProgress(
+                path.id_path, path.completed, list(pending_images.values())
+            )
+
+    def mark_images_downloaded(self, id_path: int, img_paths: List[str]) -> None:
+        """
+        Records, in its own transaction, that the image files of a path were written.
+        Images of other paths stored under the same file path are left as they are.
+        """
+        if len(img_paths) == 0:
+            return
+        images = Image.__table__
+        points = PointForDatabase.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                images.update()
+                .where(
+                    images.c.img_path.in_(img_paths),
+                    images.c.id_point.in_(
+                        select(points.c.id_point).where(points.c.id_path == id_path)
+                    ),
+                )
+                .values(downloaded=True)
+            )
+
+    def mark_path_completed(self, id_path: int) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                PathForDatabase.__table__.update()
+                .where(PathForDatabase.__table__.c.id_path == id_path)
+                .values(completed=True)
+            )
+
     def destroy(self) -> None:
         close_all_sessions()
         Base.metadata.drop_all(self.engine)
         # seems not to be working
+
+
+def insert_with_ids(connection: Connection, table: Table, rows: List[Row]) -> List[int]:
+    """
+    Inserts the rows with bulk_insert, their primary keys reserved from the key's
+    sequence beforehand, so that keys never depend on the order rows are inserted or
+    returned in. Dialects without sequences insert row by row.
+
+    :return: primary key of every row, in the given order
+    """
+    if len(rows) == 0:
+        return []
+    primary_key = table.primary_key.columns.values()[0]
+    sequence = primary_key.default
+    if not (isinstance(sequence, Sequence) and connection.dialect.supports_sequences):
+        return [
+            connection.execute(table.insert().values(row)).inserted_primary_key[0]
+            for row in rows
+        ]
+
+    ids = reserve_ids(connection, sequence, len(rows))
+    bulk_insert(
+        connection,
+        table,
+        [{**row, primary_key.name: id} for row, id in zip(rows, ids)],
+    )
+    return ids
+
+
+def reserve_ids(
+    connection: Connection, sequence: "Sequence[Integer]", count: int
+) -> List[int]:
+    """
+    :return: count values of the sequence, taken in a single query
+    """
+    query = select(sequence.next_value()).select_from(func.generate_series(1, count))
+    return [int(id) for id in connection.execute(query).scalars()]
+
+
+def bulk_insert(connection: Connection, table: Table, rows: List[Row]) -> None:
+    """
+    Inserts the rows by batches of INSERT_BATCH_SIZE with multi-row INSERT statements
+    """
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        connection.execute(table.insert().values(rows[start : start + INSERT_BATCH_SIZE]))
@@ -1,3 +1,4 @@
+import logging
 from pathlib import Path
 import typing
 from typing import Dict, List, Union
@@ -5,16 +6,19 @@ from typing import Dict, List, Union
 import requests
 from requests import Response
 
+from jeddah import http_client
 from jeddah.conversion_functions import coords_as_path_str
-from jeddah.point import Point
+from jeddah.point_array import PathLike
 from settings.settings import settings
 
 
+logger = logging.getLogger(__name__)
+
 API_KEY = settings.api_key.get_secret_value()
 BASE_MAPS = settings.maps_base
 
 
-def get_map(path: List[Point]) -> Response:
+def get_map(path: PathLike) -> Response:
     """
     Returns a map with the markers placed where indicated by path
     """
@@ -24,7 +28,7 @@ def get_map(path: List[Point]) -> Response:
         "size": "500x400",
         "scale": 4,
     }
-    response = requests.get(BASE_MAPS, params=params)
+    response = http_client.get(BASE_MAPS, params=params)
     return response
 
 
@@ -44,7 +48,7 @@ def get_map_w_paths(
         "center": "48.869196 2.338722",
         "zoom": 15,
     }
-    response = requests.get(BASE_MAPS, params=params)
+    response = http_client.get(BASE_MAPS, params=params)
 
     try:
         response.raise_for_status()
@@ -55,22 +59,36 @@ def get_map_w_paths(
     return response
 
 
-def save_map(path: List[Point], project_directory: Path) -> None:
+def save_map(path: PathLike, project_directory: Path) -> bool:
     """
     Requests a map and stores it into the project directory
+
+    :return: False if the map request failed, nothing is then written
     """
-    map_request = get_map(path)
-    map_path = project_directory / "map.png"
-    with map_path.open("wb") as file:
-        file.write(map_request.content)
-    map_request.close()
+    return write_map(get_map(path), project_directory / "map.png")
 
 
 def save_map_from_request(
     map_request: Response, project_directory: Path, name: str = ""
-) -> None:
+) -> bool:
     name_of_image = "map" + name + ".png"
-    map_path = project_directory / name_of_image
+    return write_map(map_request, project_directory / name_of_image)
+
+
+def write_map(map_request: Response, map_path: Path) -> bool:
+    """
+    Writes the map of a response, error responses are reported and not written
+
+    :return: False if the response was an error
+    """
+    try:
+        map_request.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        logger.warning("Map %s not written: %s", map_path, e)
+        map_request.close()
+        return False
+
     with map_path.open("wb") as file:
         file.write(map_request.content)
     map_request.close()
+    return True
@@ -0,0 +1,183 @@
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from jeddah.request_scheduler import RequestScheduler
+from settings.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_scheduler: Optional[RequestScheduler] = None
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide session used for every call to Google APIs. Connections
+    are kept alive and pooled per host, so the TLS handshake is paid once per pooled
+    connection instead of once per request.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.http_pool_connections,
+                pool_maxsize=settings.http_pool_maxsize or requests_in_flight(),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+
+    return _session
+
+
+def requests_in_flight() -> int:
+    """
+    Returns the most requests sent at once: by the planning and download workers of
+    the pipeline of every batch cell, or by the workers snapping a path
+    """
+
+    pipeline_requests = (
+        settings.pipeline_planning_workers + settings.image_download_workers
+    )
+    return max(pipeline_requests * settings.batch_cell_workers, settings.snap_workers)
+
+
+def send(url: str, params: Any = None) -> Response:
+    """
+    Sends a GET request through the shared session, with the configured timeouts
+    """
+
+    return get_session().get(
+        url,
+        params=params,
+        timeout=(settings.http_connect_timeout, settings.http_read_timeout),
+    )
+
+
+def endpoint_rates() -> Dict[str, float]:
+    """
+    Returns the requests per second allowed on every Google endpoint
+    """
+
+    return {
+        "street_view": settings.street_view_qps,
+        "street_view_metadata": settings.street_view_metadata_qps,
+        "static_maps": settings.static_maps_qps,
+        "roads": settings.roads_qps,
+    }
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    Returns the process-wide scheduler, rate limiting each Google endpoint to its
+    configured requests per second
+    """
+    global _scheduler
+
+    with _session_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                send,
+                rates=endpoint_rates(),
+                endpoints={
+                    settings.pic_base: "street_view",
+                    settings.meta_base: "street_view_metadata",
+                    settings.maps_base: "static_maps",
+                    settings.roads_base: "roads",
+                },
+            )
+
+    return _scheduler
+
+
+def get(url: str, params: Any = None) -> Response:
+    """
+    Sends a GET request through the scheduler: within the rate limit of its endpoint,
+    and retried on 429, 5xx and connection errors
+    """
+
+    return get_scheduler().get(url, params)
+
+
+def request_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Returns the throughput metrics of every endpoint contacted so far
+    """
+
+    return get_scheduler().metrics()
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Returns, for every endpoint host contacted so far, the number of requests sent, the
+    number of connections opened and how many requests reused an open connection
+    """
+
+    stats: Dict[str, Dict[str, int]] = dict()
+    if _session is None:
+        return stats
+
+    for scheme in ("https://", "http://"):
+        adapter = _session.get_adapter(scheme)
+        if not isinstance(adapter, HTTPAdapter):
+            continue
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            endpoint = f"{pool_key.key_scheme}://{pool_key.key_host}"
+            stats[endpoint] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+
+    return stats
+
+
+def close_session() -> None:
+    """
+    Closes every pooled connection. A new session is created on next request.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def log_request_metrics() -> None:
+    """
+    Logs the requests sent to every endpoint, their throughput and their retries
+    """
+
+    for endpoint, metrics in request_metrics().items():
+        logger.info(
+            f"{endpoint}: {int(metrics['requests'])} requests, "
+            f"{metrics['requests_per_second']:.1f} per second, "
+            f"{int(metrics['retries'])} retries ({int(metrics['throttled'])} throttled), "
+            f"{int(metrics['failed'])} failed"
+        )
+
+
+def log_connection_stats() -> None:
+    """
+    Logs how many connections every host needed, and how often they were reused
+    """
+
+    for endpoint, stats in connection_stats().items():
+        logger.info(
+            f"{endpoint}: {stats['connections']} connections for "
+            f"{stats['requests']} requests, {stats['reused']} reused"
+        )
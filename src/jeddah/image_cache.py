@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from hashlib import sha1
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+from typing import Any, Mapping, Optional
+
+from settings.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# request parameters that do not change the returned image
+IGNORED_PARAMETERS = {"key"}
+# fraction of max_bytes left after an eviction, so that the images after it are
+# stored without evicting again
+EVICTION_LOW_WATER = 0.9
+
+
+class ImageCache:
+    """
+    Persistent cache of Street View images, stored under a hash of the request
+    parameters. Once the cache grows over max_bytes, the least recently used images
+    are evicted until it is back under EVICTION_LOW_WATER of max_bytes. Images
+    hardlinked into projects keep using disk space once evicted, so max_bytes bounds
+    the cache, not the disk used by the images.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # size of every cached image, from the least to the most recently used,
+        # read from disk on first use
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+
+    @staticmethod
+    def key(params: Mapping[str, Any]) -> str:
+        """
+        Hashes the normalized request parameters: values as strings, location rounded
+        to 7 decimals (about 1cm), api key left out
+        """
+        normalized = {
+            name: str(value)
+            for name, value in params.items()
+            if name not in IGNORED_PARAMETERS
+        }
+        if "location" in normalized:
+            latitude, longitude = normalized["location"].split(",")
+            normalized["location"] = f"{float(latitude):.7f},{float(longitude):.7f}"
+
+        return sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path_of(self, key: str) -> Path:
+        return self.directory / key[:2] / (key + ".jpg")
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        :return: path of the cached image, None if it is not in the cache
+        """
+        cached_path = self.path_of(key)
+        try:
+            # the modification time keeps the recency of images between runs
+            os.utime(cached_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            entries = self._load_entries()
+            if key in entries:
+                entries.move_to_end(key)
+        return cached_path
+
+    def put(self, key: str, content: bytes) -> Path:
+        """
+        Stores an image in the cache, then evicts old images if needed
+        """
+        cached_path = self.path_of(key)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = cached_path.with_name(
+            f"{cached_path.name}.{threading.get_ident()}.tmp"
+        )
+        temporary_path.write_bytes(content)
+
+        with self._lock:
+            entries = self._load_entries()
+            os.replace(temporary_path, cached_path)
+            self._size += len(content) - entries.pop(key, 0)
+            entries[key] = len(content)
+            if self._size > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICTION_LOW_WATER))
+
+        return cached_path
+
+    def link_into(self, key: str, destination: Path) -> None:
+        """
+        Hardlinks the cached image at destination, copies it when hardlinks are not
+        possible (other filesystem)
+        """
+        cached_path = self.path_of(key)
+        if destination.exists():
+            destination.unlink()
+        try:
+            os.link(cached_path, destination)
+        except OSError:
+            shutil.copyfile(cached_path, destination)
+
+    def _current_size(self) -> int:
+        with self._lock:
+            self._load_entries()
+            return self._size
+
+    def _load_entries(self) -> "OrderedDict[str, int]":
+        if self._entries is None:
+            cached_files = []
+            for path in self.directory.glob("*/*.jpg"):
+                stat = path.stat()
+                cached_files.append((stat.st_mtime, path.stem, stat.st_size))
+            cached_files.sort()
+            self._entries = OrderedDict(
+                (key, file_size) for _, key, file_size in cached_files
+            )
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def _evict(self, target_bytes: int) -> None:
+        entries = self._load_entries()
+        while entries and self._size > target_bytes:
+            key, file_size = entries.popitem(last=False)
+            try:
+                self.path_of(key).unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= file_size
+
+
+_image_cache: Optional[ImageCache] = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    """
+    Returns the process-wide image cache, None if disabled by setting
+    image_cache_max_bytes to 0
+    """
+    global _image_cache
+
+    if settings.image_cache_max_bytes <= 0:
+        return None
+
+    with _image_cache_lock:
+        if _image_cache is None:
+            directory = settings.image_cache_directory
+            if directory is None:
+                directory = settings.database_directory / "image_cache"
+            _image_cache = ImageCache(directory, settings.image_cache_max_bytes)
+
+    return _image_cache
+
+
+def log_image_cache_stats() -> None:
+    """
+    Logs the images found in the image cache and the ones requested, if it is enabled
+    """
+
+    image_cache = get_image_cache()
+    if image_cache is not None:
+        logger.info(f"image cache: {image_cache.hits} hits, {image_cache.misses} misses")
@@ -1,15 +1,21 @@
+from hashlib import sha1
+import logging
 from pathlib import Path
 from typing import Tuple
 
 import typer
 
+from jeddah.cli import exit_on_spent_budget, exit_on_uncached_tiles, log_run_stats
 from jeddah.conversion_functions import create_path
+from jeddah.cost_estimate import cost_estimate_lines, estimate_project_cost
 from jeddah.create_path import process_path
 from jeddah.database_config import Database
 from jeddah.display_map import save_map
+from jeddah.pipeline import collect_project_images
 from jeddah.point import Point
-from jeddah.request_daedal import daedal_from_point
+from jeddah.request_daedal import road_chains_from_point
 from jeddah.request_images import get_images_along_path
+from jeddah.spatial_index import SpatialIndex
 from settings.settings import settings
 
 
@@ -24,20 +30,49 @@ app = typer.Typer()
 
 
 @app.command()
-def main(project_name: str, center_point_as_tuple: Tuple[float, float]) -> None:
-    database = Database()
-    center_point = Point(
-        center_point_as_tuple[0], center_point_as_tuple[1]
+def main(
+    project_name: str,
+    center_point_as_tuple: Tuple[float, float],
+    dry_run: bool = typer.Option(
+        False, help="Estimate the requests from the cached road network, send none"
+    ),
+) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    center_point = Point(center_point_as_tuple[0], center_point_as_tuple[1])
+    if dry_run:
+        with exit_on_uncached_tiles():
+            chains = road_chains_from_point(center_point, radius=300, offline=True)
+        estimate = estimate_project_cost(chains.items(), threshold=10)
+        for line in cost_estimate_lines(estimate):
+            typer.echo(line)
+        return
+
+    database = (
+        Database()
     )  # add right database name, depends on final place where img stored
     database.setup()
     project_directory = DATABASE_DIRECTORY / project_name
-    project_directory.mkdir(parents=True)
-    daedal = daedal_from_point(center_point=center_point, radius=300, threshold=10)
-    for id, path in daedal.items():
-        path_directory = project_directory / str(id)
-        path_directory.mkdir()
-        get_images_along_path(path, project_name, database, path_directory)
-        save_map(path, path_directory)
+    # an existing project is resumed, its completed paths are skipped
+    project_directory.mkdir(parents=True, exist_ok=True)
+    # roads are sampled, checked and photographed through a pipeline, so that
+    # network, disk and database work overlap
+    chains = road_chains_from_point(center_point=center_point, radius=300)
+    spatial_index = SpatialIndex(threshold=10)
+    with exit_on_spent_budget():
+        pipeline = collect_project_images(
+            project_name,
+            chains.items(),
+            threshold=10,
+            database=database,
+            project_directory=project_directory,
+            spatial_index=spatial_index,
+        )
+    typer.echo(
+        f"{pipeline.processed['plan']} paths processed, "
+        f"{spatial_index.dropped} duplicate points removed across paths, "
+        f"{spatial_index.requests_saved} requests saved"
+    )
+    log_run_stats()
 
 
 def add_path(project_name: str, path: str) -> None:
@@ -45,12 +80,26 @@ def add_path(project_name: str, path: str) -> None:
         Database()
     )  # add right database name, depends on final place where img stored
     database.setup()
-    project_directory = DATABASE_DIRECTORY / project_name
-    project_directory.mkdir(parents=True)
+    # each path gets its own directory and key, so that adding it again resumes it
+    # and other paths of the project are left untouched
+    path_key = sha1(path.encode("utf-8")).hexdigest()[:16]
+    path_directory = DATABASE_DIRECTORY / project_name / path_key
+    path_directory.mkdir(parents=True, exist_ok=True)
     path_as_point_list = create_path(path)
     processed_path = process_path(path_as_point_list)
-    get_images_along_path(processed_path, project_name, database, project_directory)
-    save_map(processed_path, project_directory)
+    id_path, failed = get_images_along_path(
+        processed_path, project_name, database, path_directory, path_key
+    )
+    save_map(processed_path, path_directory)
+    if failed:
+        # failed images stay pending, adding the path again requests them
+        typer.secho(
+            f"{failed} images failed, add the path again to retry them",
+            fg=typer.colors.RED,
+            err=True,
+        )
+        return
+    database.mark_path_completed(id_path)
 
 
 if __name__ == "__main__":
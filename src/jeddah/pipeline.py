@@ -0,0 +1,301 @@
+from pathlib import Path
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from requests import Response
+
+from jeddah.database_config import Database
+from jeddah.display_map import save_map
+from jeddah.point_array import PathLike, PointArray
+from jeddah.request_daedal import iter_completed_paths
+from jeddah.request_images import (
+    ImageDownload,
+    fetch_image,
+    plan_path_images,
+    write_image,
+)
+from jeddah.spatial_index import SpatialIndex, deduplicate_paths
+from settings.settings import settings
+
+
+# a stage turns each item it receives into any number of items for the next stage
+StageFunction = Callable[[Any], Iterable[Any]]
+
+# marks the end of the items in a queue
+_END = object()
+
+
+class Pipeline:
+    """
+    Runs stages in their own threads, connected by bounded queues: every stage works
+    as soon as the previous one produced an item, and a slow stage blocks the stages
+    before it instead of letting items pile up in memory. Items keep their order
+    through stages with a single worker.
+
+    Once a stage raises, it and the stages before it stop taking items, while the
+    stages after it finish the items already produced.
+    """
+
+    def __init__(self, source: Iterable[Any], queue_size: Optional[int] = None) -> None:
+        """
+        :param source: items of the first stage, iterated in its own thread
+        :param queue_size: defaults to settings.pipeline_queue_size
+        """
+        self.source = source
+        self.queue_size = (
+            settings.pipeline_queue_size if queue_size is None else queue_size
+        )
+        self.stages: List[Tuple[str, StageFunction, int]] = []
+        # items processed by every stage
+        self.processed: Dict[str, int] = dict()
+        self._errors: List[BaseException] = []
+        self._failed = threading.Event()
+        # index of the earliest stage that raised, -1 for the source
+        self._failed_stage: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add_stage(
+        self, name: str, function: StageFunction, workers: int = 1
+    ) -> "Pipeline":
+        self.stages.append((name, function, workers))
+        self.processed[name] = 0
+        return self
+
+    def run(self) -> None:
+        """
+        Runs every stage until the source is exhausted. Outputs of the last stage are
+        dropped.
+
+        :raises: the first exception raised by the source or a stage, once every
+            thread stopped
+        """
+        queues: List["queue.Queue[Any]"] = [
+            queue.Queue(maxsize=self.queue_size) for _ in self.stages
+        ]
+        running_workers = [workers for _, _, workers in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(queues[0],), daemon=True)]
+        for index, (name, function, workers) in enumerate(self.stages):
+            output_queue = queues[index + 1] if index + 1 < len(queues) else None
+            for _ in range(workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(
+                            name,
+                            function,
+                            queues[index],
+                            output_queue,
+                            running_workers,
+                            index,
+                        ),
+                        daemon=True,
+                    )
+                )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _fail(self, error: BaseException, index: int) -> None:
+        with self._lock:
+            self._errors.append(error)
+            if self._failed_stage is None or index < self._failed_stage:
+                self._failed_stage = index
+        self._failed.set()
+
+    def _is_stopped(self, index: int) -> bool:
+        with self._lock:
+            return self._failed_stage is not None and index <= self._failed_stage
+
+    def _feed(self, output_queue: "queue.Queue[Any]") -> None:
+        try:
+            for item in self.source:
+                if self._failed.is_set():
+                    break
+                output_queue.put(item)
+        except BaseException as error:
+            self._fail(error, -1)
+        output_queue.put(_END)
+
+    def _work(
+        self,
+        name: str,
+        function: StageFunction,
+        input_queue: "queue.Queue[Any]",
+        output_queue: "Optional[queue.Queue[Any]]",
+        running_workers: List[int],
+        index: int,
+    ) -> None:
+        while True:
+            item = input_queue.get()
+            if item is _END:
+                # left for the other workers of the stage
+                input_queue.put(_END)
+                break
+            if self._is_stopped(index):
+                # items are still consumed, so that no stage stays blocked
+                continue
+            try:
+                for output in function(item):
+                    if output_queue is not None:
+                        output_queue.put(output)
+                with self._lock:
+                    self.processed[name] += 1
+            except BaseException as error:
+                self._fail(error, index)
+
+        with self._lock:
+            running_workers[index] -= 1
+            is_last_worker = running_workers[index] == 0
+        if is_last_worker and output_queue is not None:
+            output_queue.put(_END)
+
+
+class PathJob:
+    """
+    A path going through the project pipeline. It is completed once all its images
+    are written and recorded in the database.
+    """
+
+    def __init__(self, path_key: str, path: PointArray, directory: Path) -> None:
+        self.path_key = path_key
+        self.path = path
+        self.directory = directory
+        self.id_path: Optional[int] = None
+        self.remaining_images = 0
+        # a path with a failed image is left started, to be resumed
+        self.has_failed_images = False
+
+
+# a path, one of its downloads (None for a path without images) and its response
+ImageJob = Tuple[PathJob, Optional[ImageDownload], Optional[Response]]
+
+
+def collect_project_images(
+    project_name: str,
+    chains: Iterable[Tuple[str, PathLike]],
+    threshold: int,
+    database: Database,
+    project_directory: Path,
+    spatial_index: Optional[SpatialIndex] = None,
+) -> Pipeline:
+    """
+    Samples and deduplicates the road chains, then gets their images with
+    collect_paths_images. Chains are sampled while the first paths are photographed.
+
+    :param chains: road chains to sample, with the key identifying them in the project
+    :param spatial_index: index of the points kept so far, shared between calls to
+        deduplicate across projects or areas
+    :return: the pipeline, once run
+    """
+    if spatial_index is None:
+        spatial_index = SpatialIndex(threshold)
+    # chains are resampled by settings.path_processing_workers processes. Completed
+    # paths still go through the index, so that deduplication gives the same points
+    # when a project is resumed
+    paths = deduplicate_paths(
+        iter_completed_paths(chains, threshold), threshold, spatial_index
+    )
+    return collect_paths_images(project_name, paths, database, project_directory)
+
+
+def collect_paths_images(
+    project_name: str,
+    paths: Iterable[Tuple[str, PointArray]],
+    database: Database,
+    project_directory: Path,
+) -> Pipeline:
+    """
+    Gets the images of sampled and deduplicated paths through a pipeline: metadata
+    check and planning with the path map, image download, disk write, and database
+    checkpoints. Completed paths are skipped and started ones resumed, like in
+    get_images_along_path.
+
+    :param paths: paths to photograph, with the key identifying them in the project
+    :return: the pipeline, once run
+    """
+    completed_path_keys = database.completed_path_keys(project_name)
+    # images written but not recorded yet, by path id
+    pending_img_paths: Dict[int, List[str]] = dict()
+
+    def prepare(deduplicated_path: Tuple[str, PointArray]) -> List[PathJob]:
+        path_key, path = deduplicated_path
+        if path_key in completed_path_keys:
+            return []
+        path_directory = project_directory / path_key
+        path_directory.mkdir(parents=True, exist_ok=True)
+        return [PathJob(path_key, path, path_directory)]
+
+    def plan(path_job: PathJob) -> List[ImageJob]:
+        save_map(path_job.path, path_job.directory)
+        # metadata is requested by the planning workers themselves, a pool within
+        # the stage would multiply the requests in flight
+        path_job.id_path, downloads = plan_path_images(
+            path_job.path,
+            project_name,
+            database,
+            path_job.directory,
+            path_job.path_key,
+            metadata_workers=1,
+        )
+        if len(downloads) == 0:
+            path_job.remaining_images = 1
+            return [(path_job, None, None)]
+        path_job.remaining_images = len(downloads)
+        return [(path_job, download, None) for download in downloads]
+
+    def fetch(image_job: ImageJob) -> List[ImageJob]:
+        path_job, download, _ = image_job
+        if download is None:
+            return [image_job]
+        return [(path_job, download, fetch_image(download))]
+
+    def write(image_job: ImageJob) -> List[ImageJob]:
+        path_job, download, img_request = image_job
+        if download is not None and img_request is not None:
+            if not write_image(download, img_request):
+                path_job.has_failed_images = True
+                return [(path_job, None, None)]
+        return [(path_job, download, None)]
+
+    def flush_pending_images() -> None:
+        for id_path, img_paths in pending_img_paths.items():
+            database.mark_images_downloaded(id_path, img_paths)
+        pending_img_paths.clear()
+
+    def record(image_job: ImageJob) -> List[Any]:
+        path_job, download, _ = image_job
+        if download is not None and path_job.id_path is not None:
+            pending_img_paths.setdefault(path_job.id_path, []).append(str(download[2]))
+        path_job.remaining_images -= 1
+        is_path_completed = path_job.remaining_images == 0
+        pending_count = sum(len(img_paths) for img_paths in pending_img_paths.values())
+        if pending_count >= settings.checkpoint_batch_size or is_path_completed:
+            flush_pending_images()
+        if (
+            is_path_completed
+            and path_job.id_path is not None
+            and not path_job.has_failed_images
+        ):
+            database.mark_path_completed(path_job.id_path)
+        return []
+
+    pipeline = (
+        Pipeline(paths)
+        .add_stage("prepare", prepare)
+        .add_stage("plan", plan, workers=settings.pipeline_planning_workers)
+        .add_stage("fetch", fetch, workers=settings.image_download_workers)
+        .add_stage("write", write, workers=settings.pipeline_writing_workers)
+        .add_stage("record", record)
+    )
+    try:
+        pipeline.run()
+    finally:
+        # images written since the last checkpoint of a run stopped by an error
+        flush_pending_images()
+    return pipeline
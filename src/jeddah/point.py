@@ -3,6 +3,8 @@ from typing import Any
 
 
 class Point:
+    __slots__ = ("latitude", "longitude")
+
     def __init__(self, latitude: float, longitude: float):
         # assert -90 < latitude < 90
         # assert -180 < longitude < 180
@@ -0,0 +1,169 @@
+from typing import (
+    Any,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    overload,
+)
+
+import numpy as np
+import numpy.typing as npt
+
+from jeddah.point import Point
+
+
+FloatArray = npt.NDArray[np.float64]
+IdArray = npt.NDArray[np.int64]
+
+
+class PointArray:
+    """
+    Compact path of points, stored as two contiguous float64 arrays (16 bytes per
+    point). Single elements are returned as Point objects, slices as PointArray views
+    sharing the same memory.
+    """
+
+    __slots__ = ("latitudes", "longitudes")
+
+    def __init__(self, latitudes: Any, longitudes: Any) -> None:
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if latitudes.ndim != 1 or latitudes.shape != longitudes.shape:
+            raise ValueError("Latitudes and longitudes must be 1D arrays of same length")
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+
+    @classmethod
+    def from_points(cls, points: Iterable[Point]) -> "PointArray":
+        """
+        Builds a PointArray from any iterable of points
+        """
+        coordinates = [(point.latitude, point.longitude) for point in points]
+        if len(coordinates) == 0:
+            return cls.empty()
+        latitudes, longitudes = zip(*coordinates)
+        return cls(latitudes, longitudes)
+
+    @classmethod
+    def empty(cls) -> "PointArray":
+        return cls(np.empty(0), np.empty(0))
+
+    @classmethod
+    def concatenate(cls, point_arrays: Iterable["PointArray"]) -> "PointArray":
+        """
+        Joins several paths into a single one, in the given order
+        """
+        point_arrays = list(point_arrays)
+        if len(point_arrays) == 0:
+            return cls.empty()
+        return cls(
+            np.concatenate([point_array.latitudes for point_array in point_arrays]),
+            np.concatenate([point_array.longitudes for point_array in point_arrays]),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.latitudes.nbytes + self.longitudes.nbytes)
+
+    def coordinates(self) -> Iterator[Tuple[float, float]]:
+        """
+        Iterates over (latitude, longitude) tuples without creating Point objects
+        """
+        return zip(self.latitudes.tolist(), self.longitudes.tolist())
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    @overload
+    def __getitem__(self, index: int) -> Point:
+        ...
+
+    @overload
+    def __getitem__(self, index: Union[slice, npt.NDArray[Any]]) -> "PointArray":
+        ...
+
+    def __getitem__(self, index: Any) -> Union[Point, "PointArray"]:
+        if isinstance(index, (int, np.integer)):
+            return Point(float(self.latitudes[index]), float(self.longitudes[index]))
+        return PointArray(self.latitudes[index], self.longitudes[index])
+
+    def __iter__(self) -> Iterator[Point]:
+        for latitude, longitude in self.coordinates():
+            yield Point(latitude, longitude)
+
+    def __add__(self, other: "PointArray") -> "PointArray":
+        if not isinstance(other, PointArray):
+            return NotImplemented
+        return PointArray.concatenate([self, other])
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        Compares with another PointArray or a sequence of points, like Point does
+
+        :raises: TypeError
+        """
+        if isinstance(other, PointArray):
+            other_latitudes, other_longitudes = other.latitudes, other.longitudes
+        elif isinstance(other, Sequence):
+            other_array = PointArray.from_points(other)
+            other_latitudes, other_longitudes = (
+                other_array.latitudes,
+                other_array.longitudes,
+            )
+        else:
+            raise TypeError("Wrong type comparison. You are not comparing two paths. ")
+
+        if len(self) != len(other_latitudes):
+            return False
+        return bool(
+            np.allclose(self.latitudes, other_latitudes, rtol=1e-09, atol=0)
+            and np.allclose(self.longitudes, other_longitudes, rtol=1e-09, atol=0)
+        )
+
+    def __repr__(self) -> str:
+        return "PointArray([" + "|".join(str(point) for point in self) + "])"
+
+
+PathLike = Union[Sequence[Point], PointArray]
+# paths are keyed by number or by chain key
+PathKey = TypeVar("PathKey", bound=Hashable)
+
+
+def as_point_array(path: PathLike) -> PointArray:
+    """
+    Returns the path itself if it already is a PointArray, converts it otherwise
+    """
+    if isinstance(path, PointArray):
+        return path
+    return PointArray.from_points(path)
+
+
+def pack_paths(paths: Iterable[PointArray]) -> Tuple[FloatArray, FloatArray, IdArray]:
+    """
+    Packs several paths into three flat arrays, cheap to send to another process
+
+    :return: latitudes, longitudes, and offsets (path i is points
+        offsets[i]:offsets[i + 1])
+    """
+    paths = list(paths)
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(path) for path in paths], out=offsets[1:])
+    path = PointArray.concatenate(paths)
+    return path.latitudes, path.longitudes, offsets
+
+
+def unpack_paths(
+    latitudes: FloatArray, longitudes: FloatArray, offsets: IdArray
+) -> List[PointArray]:
+    """
+    Opposite of pack_paths, paths are views over the flat arrays
+    """
+    return [
+        PointArray(latitudes[start:end], longitudes[start:end])
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
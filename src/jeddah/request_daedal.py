@@ -1,45 +1,51 @@
-from typing import Any, Dict, List, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from hashlib import sha1
+from itertools import chain, islice
+import json
+import os
+from pathlib import Path
+import re
+import time
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from osmnx import downloader, utils_geo
+from osmnx import downloader, settings as ox_settings, utils_geo
+import requests
 from shapely.geometry import Polygon
 
-from jeddah.create_path import compute_distance_with_haversine, process_path
+from jeddah.create_path import distances_to_point, process_path
 from jeddah.point import Point
+from jeddah.point_array import (
+    FloatArray,
+    IdArray,
+    PathKey,
+    PathLike,
+    PointArray,
+    as_point_array,
+    pack_paths,
+    unpack_paths,
+)
+from jeddah.road_graph import RoadGraph
+from jeddah.road_network import (
+    CHUNK_SIZE,
+    RoadNetwork,
+    RoadNetworkBuilder,
+    iter_overpass_elements,
+)
+from jeddah.road_tiles import (
+    RoadTileCache,
+    get_road_tile_cache,
+    tile_polygon,
+    tiles_covering,
+)
+from settings.settings import settings
 
 
-def daedal_from_point(
-    center_point: Point, radius: int, threshold: int
-) -> Dict[int, List[Point]]:
-    polygon_boundaries = create_polygon(center_point, radius)
-    nodes_dict, paths_dict = request_nodes_and_paths(polygon_boundaries)
-    paths_pruned = keep_points_within_radius(center_point, radius, nodes_dict, paths_dict)
-    path_filled = complete_all_paths(paths_pruned, threshold)
-    return path_filled
-
-
-def create_polygon(center_point: Point, radius: int) -> Polygon:
-    north, south, east, west = utils_geo.bbox_from_point(
-        point=(center_point.latitude, center_point.longitude), dist=radius
-    )
-    # convert bounding box to a polygon
-    polygon = utils_geo.bbox_to_poly(north, south, east, west)
-    return polygon
-
-
-def request_nodes_and_paths(
-    polygon: Polygon,
-) -> Tuple[Dict[int, Point], Dict[int, Any]]:
-    nodes = dict()
-    paths = dict()
-    network_type = "all_private"
-    custom_filter = None
-
-    # download the network data from OSM
-    response_jsons = downloader._osm_network_download(
-        polygon, network_type, custom_filter
-    )
-
-    accepted_highway_types = [
+NETWORK_TYPE = "all_private"
+# nodes slightly outside of the radius are kept, so that roads reach its border
+RADIUS_MARGIN = 50
+ACCEPTED_HIGHWAY_TYPES = frozenset(
+    [
         "motorway",
         "trunk",
         "primary",
@@ -55,50 +61,246 @@ def request_nodes_and_paths(
         "living_street",
         "pedestrian",
     ]
+)
+# Overpass is overloaded, osmnx pauses for a minute then sends the query again
+OVERPASS_RETRIED_STATUSES = frozenset([429, 504])
+OVERPASS_ERROR_PAUSE = 60
+# Overpass reports a query that ran out of time or memory with a remark after the
+# elements it returned so far
+OVERPASS_REMARK = re.compile(rb'\]\s*,\s*("remark"\s*:\s*"(?:[^"\\]|\\.)*")\s*\}\s*$')
+REMARK_TAIL_SIZE = 4096
+
+PackedPaths = Tuple[FloatArray, FloatArray, IdArray]
+
+
+def road_chains_from_point(
+    center_point: Point, radius: int, offline: bool = False
+) -> Dict[str, PointArray]:
+    """
+    :param offline: only use the road tile cache, see request_tiled_road_network
+    :return: road chains within the radius, not sampled yet, keyed by chain_key
+    """
+    polygon_boundaries = create_polygon(center_point, radius)
+    network = request_tiled_road_network(polygon_boundaries, offline=offline)
+    # ways are merged at shared nodes, so that each road segment is sampled once
+    distances = distances_to_point(network.latitudes, network.longitudes, center_point)
+    road_graph = RoadGraph.from_network(network, distances < radius + RADIUS_MARGIN)
+    return road_graph.chain_paths()
+
+
+def create_polygon(center_point: Point, radius: int) -> Polygon:
+    north, south, east, west = utils_geo.bbox_from_point(
+        point=(center_point.latitude, center_point.longitude), dist=radius
+    )
+    # convert bounding box to a polygon
+    polygon = utils_geo.bbox_to_poly(north, south, east, west)
+    return polygon
+
+
+def request_road_network(polygon: Polygon, stream: bool = False) -> RoadNetwork:
+    """
+    Downloads the roads within the polygon and keeps the accepted highway types, with
+    only the nodes they use
+
+    :param stream: parse the responses as streams instead of fully loaded JSON
+    """
+    builder = RoadNetworkBuilder(ACCEPTED_HIGHWAY_TYPES)
 
-    for response_json in response_jsons:
-        for element in response_json["elements"]:
-            # we have to be sure that all nodes are handled first. Maybe modify code
-            if element["type"] == "node":
-                nodes[int(element["id"])] = Point(element["lat"], element["lon"])
-            elif (
-                element["type"] == "way"
-                and element["tags"]["highway"] in accepted_highway_types
-            ):
-                paths[int(element["id"])] = element["nodes"]
-
-    return nodes, paths
-
-
-def keep_points_within_radius(
-    center_point: Point, radius: int, nodes: Dict[int, Point], paths: Dict[int, Any]
-) -> Dict[int, List[Point]]:
-    # center_point = Point(center_point[0], center_point[1])
-    paths_points = dict()
-
-    for id, node_list in paths.items():
-        list_of_points = []
-        for node_id in node_list:
-            if (
-                compute_distance_with_haversine(nodes[node_id], center_point)
-                < radius + 50
-            ):
-                list_of_points.append(nodes[node_id])
-        paths_points[id] = list_of_points
-
-    return paths_points
-
-
-def complete_all_paths(
-    paths_points: Dict[int, List[Point]], threshold: int
-) -> Dict[int, List[Point]]:
-    paths_filled = dict()
-    for id, point_list in paths_points.items():
-        if len(point_list) != 0:
-            point_list_processed = process_path(point_list, threshold)
-            paths_filled[id] = point_list_processed
-
-    return paths_filled
+    if stream:
+        builder.add_elements(stream_network_elements(polygon))
+    else:
+        # download the network data from OSM
+        response_jsons = downloader._osm_network_download(polygon, NETWORK_TYPE, None)
+        for response_json in response_jsons:
+            builder.add_elements(response_json["elements"])
+
+    return builder.build()
+
+
+def request_tiled_road_network(
+    polygon: Polygon, tile_cache: Optional[RoadTileCache] = None, offline: bool = False
+) -> RoadNetwork:
+    """
+    Builds the road network of the tiles covering the polygon. Tiles already in the
+    cache are loaded from disk, only the missing ones are downloaded.
+
+    :param offline: nothing is downloaded
+    :raises FileNotFoundError: offline, if a tile is not in the cache
+    """
+    if tile_cache is None:
+        tile_cache = get_road_tile_cache()
+
+    builder = RoadNetworkBuilder(ACCEPTED_HIGHWAY_TYPES)
+    for tile in tiles_covering(polygon, tile_cache.zoom):
+        network = tile_cache.load(tile)
+        if network is None:
+            if offline:
+                raise FileNotFoundError(
+                    f"Road network of tile {tile} is not cached in "
+                    f"{tile_cache.directory}"
+                )
+            network = request_road_network(
+                tile_polygon(tile, tile_cache.zoom), stream=True
+            )
+            tile_cache.save(tile, network)
+        builder.add_network(network)
+
+    return builder.build()
+
+
+def stream_network_elements(polygon: Polygon) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the elements of the same Overpass queries as downloader._osm_network_download,
+    one by one, from responses streamed to the osmnx cache folder
+    """
+    osm_filter = downloader._get_osm_filter(NETWORK_TYPE)
+    overpass_settings = downloader._make_overpass_settings()
+
+    for polygon_coord_str in downloader._make_overpass_polygon_coord_strs(polygon):
+        query_str = (
+            f"{overpass_settings};(way{osm_filter}(poly:'{polygon_coord_str}');>;);out;"
+        )
+        response_path = download_overpass_response({"data": query_str})
+        with response_path.open(encoding="utf-8") as response_stream:
+            yield from iter_overpass_elements(response_stream)
+
+
+class OverpassError(Exception):
+    """
+    Raised when Overpass answers with a remark instead of the full response
+    """
+
+
+def overpass_remark(response_path: Path) -> Optional[str]:
+    """
+    :return: the remark ending an Overpass response file, None if it has none
+    """
+    with response_path.open("rb") as file:
+        file.seek(max(0, response_path.stat().st_size - REMARK_TAIL_SIZE))
+        match = OVERPASS_REMARK.search(file.read())
+    if match is None:
+        return None
+    return str(json.loads(b"{" + match.group(1) + b"}")["remark"])
+
+
+def download_overpass_response(data: Dict[str, str]) -> Path:
+    """
+    Writes the Overpass response to its osmnx cache file chunk by chunk, unless it is
+    already cached. Like osmnx, queries answered with 429 or 504 are sent again after
+    a pause, and cached responses with a remark are downloaded again.
+
+    :return: path of the cache file
+    :raises: OverpassError if the response has a remark, it is then not cached
+    """
+    url = ox_settings.overpass_endpoint.rstrip("/") + "/interpreter"
+    # osmnx names cache files after the GET-style url of the query
+    prepared_url = str(requests.Request("GET", url, params=data).prepare().url)
+    filename = sha1(prepared_url.encode("utf-8")).hexdigest() + ".json"
+    response_path = Path(ox_settings.cache_folder) / filename
+    if (
+        ox_settings.use_cache
+        and response_path.exists()
+        and overpass_remark(response_path) is None
+    ):
+        return response_path
+
+    while True:
+        time.sleep(downloader._get_pause(ox_settings.overpass_endpoint))
+        response = requests.post(
+            url,
+            data=data,
+            timeout=ox_settings.timeout,
+            headers=downloader._get_http_headers(),
+            stream=True,
+        )
+        if response.status_code not in OVERPASS_RETRIED_STATUSES:
+            break
+        response.close()
+        time.sleep(OVERPASS_ERROR_PAUSE)
+    response.raise_for_status()
+
+    response_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = response_path.with_suffix(".tmp")
+    with temporary_path.open("wb") as file:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            file.write(chunk)
+    response.close()
+
+    remark = overpass_remark(temporary_path)
+    if remark is not None:
+        temporary_path.unlink()
+        raise OverpassError(f"Overpass answered with a remark: {remark}")
+    os.replace(temporary_path, response_path)
+
+    return response_path
+
+
+def iter_completed_paths(
+    paths_points: Iterable[Tuple[PathKey, PathLike]],
+    threshold: int,
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[PathKey, PointArray]]:
+    """
+    Fills and prunes every non empty path, yielding them in order as soon as they are
+    ready. With several workers, paths are sent by chunks to a process pool, each
+    chunk packed into flat arrays. At most two chunks per worker are in flight, so
+    that the first paths are used while the next ones are processed.
+
+    :param workers: number of processes, settings.path_processing_workers by default
+    """
+    if workers is None:
+        workers = settings.path_processing_workers
+    chunk_size = settings.path_processing_chunk_size
+
+    non_empty_paths = (
+        (key, point_list) for key, point_list in paths_points if len(point_list) != 0
+    )
+    chunks = iter(lambda: list(islice(non_empty_paths, chunk_size)), [])
+    if workers > 1:
+        first_chunks = list(islice(chunks, 2))
+        # a single chunk is not worth starting processes
+        if len(first_chunks) > 1:
+            yield from _iter_pool_completed_paths(
+                chain(first_chunks, chunks), threshold, workers
+            )
+            return
+        chunks = iter(first_chunks)
+
+    for chunk in chunks:
+        for key, point_list in chunk:
+            yield key, as_point_array(process_path(point_list, threshold))
+
+
+def _iter_pool_completed_paths(
+    chunks: Iterator[List[Tuple[PathKey, PathLike]]], threshold: int, workers: int
+) -> Iterator[Tuple[PathKey, PointArray]]:
+    # keys of the paths of every chunk sent, with the future of the processed chunk
+    in_flight: "Deque[Tuple[List[PathKey], Future[PackedPaths]]]" = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for chunk in chunks:
+                packed_chunk = pack_paths(as_point_array(path) for _, path in chunk)
+                future = executor.submit(process_packed_paths, packed_chunk, threshold)
+                in_flight.append(([key for key, _ in chunk], future))
+                if len(in_flight) >= 2 * workers:
+                    keys, future = in_flight.popleft()
+                    yield from zip(keys, unpack_paths(*future.result()))
+            while in_flight:
+                keys, future = in_flight.popleft()
+                yield from zip(keys, unpack_paths(*future.result()))
+        finally:
+            # chunks left when the consumer stops early
+            for _, future in in_flight:
+                future.cancel()
+
+
+def process_packed_paths(packed_paths: PackedPaths, threshold: int) -> PackedPaths:
+    """
+    Runs process_path over paths packed by pack_paths, in a worker process
+    """
+    return pack_paths(
+        process_path(path, threshold) for path in unpack_paths(*packed_paths)
+    )
 
 
 # the part that creates the final map should be inserted here
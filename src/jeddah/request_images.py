@@ -1,15 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import requests
 from requests import Response
 
-from jeddah.create_path import get_heading
-from jeddah.database_config import Database, Image, PathForDatabase, PointForDatabase
+from jeddah import http_client
+from jeddah.create_path import get_headings
+from jeddah.database_config import Database, Image, PointForDatabase
+from jeddah.image_cache import ImageCache, get_image_cache
 from jeddah.point import Point
+from jeddah.point_array import PathLike
 from settings.settings import settings
 
 
+logger = logging.getLogger(__name__)
+
 # GLOBAL VARIABLES
 API_KEY = settings.api_key.get_secret_value()
 
@@ -17,10 +24,23 @@ API_KEY = settings.api_key.get_secret_value()
 META_BASE = settings.meta_base
 PIC_BASE = settings.pic_base
 
+# point, heading and where to write the image
+ImageDownload = Tuple[Point, int, Path]
 
-def get_single_image(point: Point, heading: int = 0) -> Response:
+# metadata statuses of a point without imagery, any other status but OK is an error
+NO_IMAGERY_STATUSES = frozenset(["ZERO_RESULTS", "NOT_FOUND"])
+
+
+class MetadataError(Exception):
+    """
+    Raised when a metadata request fails, so that a bad key, an exhausted quota or a
+    server error is never taken for a point without imagery
+    """
+
+
+def image_params(point: Point, heading: int = 0) -> Dict[str, Union[int, str]]:
     """
-    :return: JSON containing the .jpg requested image
+    :return: parameters of the Street View request for the image of a point
     """
 
     params: Dict[str, Union[int, str]] = {
@@ -34,45 +54,224 @@ def get_single_image(point: Point, heading: int = 0) -> Response:
         "radius": 50,
         "return-error-code": "true",
     }
-    response = requests.get(PIC_BASE, params=params)
+    return params
 
-    try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        print("Error: " + str(e))
-    return response
+
+def get_single_image(point: Point, heading: int = 0) -> Response:
+    """
+    :return: response containing the .jpg requested image, or the error once retries
+        are exhausted
+    """
+
+    params = image_params(point, heading)
+    return http_client.get(PIC_BASE, params=params)
 
 
 def get_metadata(point: Point) -> Any:
     """
-    Not used at the moment, could be for future issues
+    Describes the panorama get_single_image would return for this point, without
+     paying for the image. Uses the same source and radius as get_single_image.
+
+    :raises requests.exceptions.HTTPError: if the request failed
     """
-    params = {"key": API_KEY, "location": str(point)}
-    meta_response = requests.get(META_BASE, params=params)
+    params: Dict[str, Union[int, str]] = {
+        "key": API_KEY,
+        "location": str(point),
+        "source": "outdoor",
+        "radius": 50,
+    }
+    meta_response = http_client.get(META_BASE, params=params)
+    meta_response.raise_for_status()
     return meta_response
 
 
-def get_both_direction_images(
-    point: Point,
-    project_path: Path,
-    azimuth: int,
-    index: int,
-    point_for_db: PointForDatabase,
-) -> None:
+def get_pano_id(point: Point) -> Optional[str]:
     """
-    :param azimuth: direction in which the google street view car is heading, in order to
-    get side view images
+    :return: id of the panorama closest to the point, None if there is no imagery
+    :raises MetadataError: if the metadata does not tell whether there is imagery
+    """
+
+    meta_response = get_metadata(point)
+    try:
+        metadata = meta_response.json()
+    except ValueError as e:
+        raise MetadataError(
+            f"Unreadable metadata of {point}, status code {meta_response.status_code}"
+        ) from e
+    finally:
+        meta_response.close()
+
+    status = metadata.get("status")
+    if status in NO_IMAGERY_STATUSES:
+        return None
+    if status != "OK":
+        raise MetadataError(
+            f"Metadata of {point} failed with status {status}: "
+            f"{metadata.get('error_message', '')}"
+        )
+    return str(metadata["pano_id"])
+
+
+def get_pano_ids(
+    path: PathLike, max_workers: Optional[int] = None
+) -> List[Optional[str]]:
+    """
+    Requests the metadata of every point of the path concurrently
+
+    :param max_workers: defaults to settings.image_download_workers, 1 requests them
+        one after the other in the calling thread
+    :return: panorama id of every point, in the path order
+    """
+
+    if max_workers is None:
+        max_workers = settings.image_download_workers
+    if max_workers == 1:
+        return [get_pano_id(point) for point in path]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_pano_id, path))
+
+
+def deduplicate_downloads(
+    downloads_per_point: List[List[ImageDownload]], pano_ids: List[Optional[str]]
+) -> Tuple[List[ImageDownload], List[List[ImageDownload]]]:
+    """
+    Keeps a single download per panorama and heading. Points without panorama get no
+    image at all.
+
+    :return: downloads to make, and for every point the downloads whose image it uses
+    """
+
+    downloads_to_make = []
+    downloads_used_per_point = []
+    first_download_of: Dict[Tuple[str, int], ImageDownload] = dict()
+
+    for downloads, pano_id in zip(downloads_per_point, pano_ids):
+        downloads_used = []
+        if pano_id is not None:
+            for download in downloads:
+                _, heading, _ = download
+                if (pano_id, heading) not in first_download_of:
+                    first_download_of[(pano_id, heading)] = download
+                    downloads_to_make.append(download)
+                downloads_used.append(first_download_of[(pano_id, heading)])
+        downloads_used_per_point.append(downloads_used)
+
+    return downloads_to_make, downloads_used_per_point
+
+
+def side_image_downloads(
+    point: Point, project_path: Path, azimuth: int, index: int
+) -> List[ImageDownload]:
+    """
+    Lists the (point, heading, image path) downloads needed to get the images on the
+    right and on the left of a point
     """
 
+    downloads = []
     headings_offsets = [90, -90]  # to get image on right and left side
     for heading_offset in headings_offsets:
         str_heading = str(heading_offset)
         heading = azimuth + heading_offset
-        img_request = get_single_image(point, heading)
         name_of_image = "image_point_" + str(index) + "_" + str_heading + ".jpg"
-        image_path = project_path / name_of_image
+        downloads.append((point, heading, project_path / name_of_image))
+
+    return downloads
+
+
+def download_image(download: ImageDownload) -> bool:
+    """
+    Requests a single image and writes it at the download's image path. Images already
+    in the image cache are hardlinked instead of requested.
+
+    :return: False if the request failed and nothing was written
+    """
+
+    img_request = fetch_image(download)
+    if img_request is None:
+        return True
+    return write_image(download, img_request)
+
+
+def fetch_image(download: ImageDownload) -> Optional[Response]:
+    """
+    Requests the image of a download, unless it is in the image cache
+
+    :return: response of the request, None if the image was linked from the cache
+    """
+
+    point, heading, image_path = download
+    image_cache = get_image_cache()
+    if image_cache is not None:
+        cache_key = ImageCache.key(image_params(point, heading))
+        if image_cache.get(cache_key) is not None:
+            try:
+                image_cache.link_into(cache_key, image_path)
+                return None
+            except FileNotFoundError:
+                # evicted in between by another download
+                pass
+
+    return get_single_image(point, heading)
+
+
+def write_image(download: ImageDownload, img_request: Response) -> bool:
+    """
+    Writes a fetched image at the download's image path, through the image cache when
+    the response is an image. Error responses are reported and not written, so that
+    the image is requested again when the path is resumed.
+
+    :return: False if the response was an error
+    """
+
+    point, heading, image_path = download
+    try:
+        img_request.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        logger.warning("Image of %s not written: %s", image_path, e)
+        img_request.close()
+        return False
+
+    image_cache = get_image_cache()
+    is_image = img_request.ok and img_request.headers.get("Content-Type") == "image/jpeg"
+    if image_cache is not None and is_image:
+        cache_key = ImageCache.key(image_params(point, heading))
+        image_cache.put(cache_key, img_request.content)
+        image_cache.link_into(cache_key, image_path)
+    else:
         with image_path.open("wb") as file:
             file.write(img_request.content)
+    img_request.close()
+    return True
+
+
+def download_images(
+    downloads: List[ImageDownload], max_workers: Optional[int] = None
+) -> List[ImageDownload]:
+    """
+    Downloads all the images concurrently, with at most max_workers requests in flight
+
+    :param max_workers: defaults to settings.image_download_workers
+    :return: downloads whose image was written
+    """
+
+    if max_workers is None:
+        max_workers = settings.image_download_workers
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # consuming the results re-raises any exception from a worker
+        written = list(executor.map(download_image, downloads))
+    return [download for download, is_written in zip(downloads, written) if is_written]
+
+
+def add_images_to_point(
+    point_for_db: PointForDatabase, downloads: List[ImageDownload]
+) -> None:
+    """
+    Attaches to the point one image object per download, in the downloads order
+    """
+
+    for _, heading, image_path in downloads:
         # creating image object for db
         image_stored = Image(
             img_path=str(image_path),
@@ -80,44 +279,145 @@ def get_both_direction_images(
         )
         point_for_db.image_relation.append(image_stored)
 
-        img_request.close()
+
+def get_both_direction_images(
+    point: Point,
+    project_path: Path,
+    azimuth: int,
+    index: int,
+    point_for_db: PointForDatabase,
+) -> None:
+    """
+    :param azimuth: direction in which the google street view car is heading, in order to
+    get side view images
+    """
+
+    downloads = side_image_downloads(point, project_path, azimuth, index)
+    for download in downloads:
+        download_image(download)
+    add_images_to_point(point_for_db, downloads)
 
 
 def get_images_along_path(
-    path: List[Point],
+    path: PathLike,
     project_name: str,
     database: Database,
     project_directory: Path,
-) -> None:
+    path_key: Optional[str] = None,
+) -> Tuple[int, int]:
     """
-    Gets all the side images along the given points
+    Gets all the side images along the given points. Images are planned and stored
+    with plan_path_images, then downloaded concurrently and recorded as downloaded by
+    batches, so that an interrupted path resumes where it stopped.
 
     :param project_name: Name to recognize the project
     :param project_directory: Where requested images will be stored
+    :param path_key: Identifies the path within the project, a path already started
+        under this key only downloads its missing images
+    :return: id of the path in the database, and the number of images that failed.
+        Failed images are left pending, the path is only complete when none failed.
     """
 
-    # creating path object for database
-    database_path = PathForDatabase(
-        name=project_name,
-        client="Tesla",
-        street="needs geocoding",
-        city="needs geocoding",
-        country="needs geocoding",
+    id_path, downloads = plan_path_images(
+        path, project_name, database, project_directory, path_key
     )
-    # duplicating last point so it's not ignored in the for loop
-    path.append(path[-1])
-    for index, point in enumerate(path[:-1]):
-        heading = get_heading(path[index], path[index + 1])
-        # creating point object for db
-        point_for_db = PointForDatabase(
-            path_index=index, latitude=point.latitude, longitude=point.longitude
+    failed = download_images_with_checkpoints(id_path, downloads, database)
+    return id_path, failed
+
+
+def plan_path_images(
+    path: PathLike,
+    project_name: str,
+    database: Database,
+    project_directory: Path,
+    path_key: Optional[str] = None,
+    metadata_workers: Optional[int] = None,
+) -> Tuple[int, List[ImageDownload]]:
+    """
+    Plans the side images of a path and stores the path, its points and the planned
+    images, not downloaded yet. Metadata is checked first so that each panorama and
+    heading is downloaded once, points sharing it reference the same image.
+
+    :param metadata_workers: metadata requests in flight at once, see get_pano_ids
+    :return: id of the path in the database, and the downloads to make. A path already
+        started under path_key is not planned again, only its missing images are
+        returned.
+    """
+
+    if path_key is not None:
+        progress = database.path_progress(project_name, path_key)
+        if progress is not None:
+            downloads = [
+                (
+                    Point(image.latitude, image.longitude),
+                    image.heading,
+                    Path(image.img_path),
+                )
+                for image in progress.pending_images
+            ]
+            return progress.id_path, downloads
+
+    # rows for the database, written in bulk before images are downloaded
+    path_row = {
+        "name": project_name,
+        "client": "Tesla",
+        "street": "needs geocoding",
+        "city": "needs geocoding",
+        "country": "needs geocoding",
+        "path_key": path_key,
+        "completed": False,
+    }
+    headings = get_headings(path)
+    # points close to each other often resolve to the same panorama
+    pano_ids = get_pano_ids(path, metadata_workers)
+    point_rows = []
+    downloads_per_point = []
+    for index, point in enumerate(path):
+        heading = int(headings[index])
+        point_rows.append(
+            {
+                "path_index": index,
+                "latitude": point.latitude,
+                "longitude": point.longitude,
+                "pano_id": pano_ids[index],
+            }
+        )
+        downloads_per_point.append(
+            side_image_downloads(point, project_directory, heading, index)
         )
-        database_path.path_relation.append(point_for_db)
-        get_both_direction_images(
-            point,
-            project_directory,
-            heading,
-            index,
-            point_for_db,
+
+    downloads_to_make, downloads_used_per_point = deduplicate_downloads(
+        downloads_per_point, pano_ids
+    )
+    image_rows_per_point = [
+        [
+            {"img_path": str(image_path), "heading": heading, "downloaded": False}
+            for _, heading, image_path in downloads
+        ]
+        for downloads in downloads_used_per_point
+    ]
+    id_path = database.ingest_path(path_row, point_rows, image_rows_per_point)
+
+    return id_path, downloads_to_make
+
+
+def download_images_with_checkpoints(
+    id_path: int, downloads: List[ImageDownload], database: Database
+) -> int:
+    """
+    Downloads the images of a path by batches of settings.checkpoint_batch_size,
+    recording the images of each batch as downloaded in the database once written
+
+    :return: number of images that failed and were not written
+    """
+
+    batch_size = settings.checkpoint_batch_size
+    failed = 0
+    for start in range(0, len(downloads), batch_size):
+        batch = downloads[start : start + batch_size]
+        written = download_images(batch)
+        failed += len(batch) - len(written)
+        database.mark_images_downloaded(
+            id_path, [str(image_path) for _, _, image_path in written]
         )
-    database.save(database_path)
+    return failed
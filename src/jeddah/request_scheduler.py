@@ -0,0 +1,250 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests import Response
+
+from settings.settings import settings
+
+
+# sends a GET request to an url with parameters
+Send = Callable[[str, Any], Response]
+
+# transient failures worth another try
+RETRIED_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class RequestBudgetExceeded(Exception):
+    """
+    Raised instead of sending a request once the request budget of the run is spent
+    """
+
+
+def is_retried_status(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class TokenBucket:
+    """
+    Lets through rate requests per second on average, and up to capacity requests at
+    once after a pause. Waiting threads are served in the order they asked.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waiting for it if the bucket is empty
+
+        :return: seconds waited
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            # the token is taken right away, threads coming next wait for the
+            # following ones
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class EndpointMetrics:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failed = 0
+        self.waited = 0.0
+        self.first_request_at: Optional[float] = None
+        self.last_response_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, float]:
+        elapsed = 0.0
+        if self.first_request_at is not None and self.last_response_at is not None:
+            elapsed = self.last_response_at - self.first_request_at
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "waited_seconds": self.waited,
+            "requests_per_second": self.requests / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class RequestScheduler:
+    """
+    Sends every request to Google through a token bucket per endpoint, so that
+    concurrent workers stay within the quota of each API. Requests answered with 429 or
+    5xx, or failing to connect, are sent again after a jittered exponential backoff.
+    Once retries are exhausted the last error response is returned, not raised, so
+    callers check its status themselves. No request is sent once the budget is spent.
+    """
+
+    def __init__(
+        self,
+        send: Send,
+        rates: Dict[str, float],
+        endpoints: Dict[str, str],
+        burst: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        budget: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        :param rates: requests per second allowed for every endpoint
+        :param endpoints: endpoint of every base url, other urls are not rate limited
+        :param burst: defaults to settings.rate_limit_burst
+        :param max_retries: defaults to settings.http_max_retries
+        :param backoff_base: defaults to settings.http_backoff_base
+        :param backoff_max: defaults to settings.http_backoff_max
+        :param budget: requests that can be sent, retries included, defaults to
+            settings.request_budget, no limit if both are None
+        """
+        if burst is None:
+            burst = settings.rate_limit_burst
+        self.send = send
+        self.endpoints = endpoints
+        self.max_retries = (
+            settings.http_max_retries if max_retries is None else max_retries
+        )
+        self.backoff_base = (
+            settings.http_backoff_base if backoff_base is None else backoff_base
+        )
+        self.backoff_max = (
+            settings.http_backoff_max if backoff_max is None else backoff_max
+        )
+        self.budget = settings.request_budget if budget is None else budget
+        self.sent = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {
+            endpoint: TokenBucket(rate, burst, clock, sleep)
+            for endpoint, rate in rates.items()
+        }
+        self._metrics: Dict[str, EndpointMetrics] = dict()
+        self._lock = threading.Lock()
+
+    def endpoint_of(self, url: str) -> str:
+        """
+        :return: endpoint of a configured base url, the host of any other url
+        """
+        return self.endpoints.get(url, urlsplit(url).netloc)
+
+    def backoff(self, attempt: int, response: Optional[Response] = None) -> float:
+        """
+        :return: seconds to wait before the given retry, drawn between 0 and an
+            exponential bound, and never less than the Retry-After of the response
+        """
+        bound = min(self.backoff_max, self.backoff_base * 2**attempt)
+        wait = random.uniform(0, bound)
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                wait = max(wait, float(retry_after))
+        return wait
+
+    def get(self, url: str, params: Any = None) -> Response:
+        """
+        Sends a GET request once a token of its endpoint is available, retrying
+        transient failures
+
+        :return: the last response, which is an error once retries are exhausted
+        :raises: the connection error of the last attempt, RequestBudgetExceeded if
+            the budget is spent
+        """
+        endpoint = self.endpoint_of(url)
+        bucket = self._buckets.get(endpoint)
+        attempt = 0
+        while True:
+            self._spend_budget(url)
+            waited = bucket.acquire() if bucket is not None else 0.0
+            self._record(endpoint, waited=waited, started=True)
+            try:
+                response = self.send(url, params)
+            except RETRIED_EXCEPTIONS:
+                if attempt >= self.max_retries:
+                    self._record(endpoint, failed=True)
+                    raise
+                self._record(endpoint, retried=True)
+                self._sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if not is_retried_status(response.status_code):
+                self._record(endpoint, failed=not response.ok)
+                return response
+            if attempt >= self.max_retries:
+                self._record(endpoint, failed=True, throttled=response.status_code == 429)
+                return response
+            self._record(endpoint, retried=True, throttled=response.status_code == 429)
+            wait = self.backoff(attempt, response)
+            response.close()
+            self._sleep(wait)
+            attempt += 1
+
+    def _spend_budget(self, url: str) -> None:
+        with self._lock:
+            if self.budget is not None and self.sent >= self.budget:
+                raise RequestBudgetExceeded(
+                    f"Request budget of {self.budget} spent, not sending {url}"
+                )
+            self.sent += 1
+
+    def _record(
+        self,
+        endpoint: str,
+        waited: float = 0.0,
+        started: bool = False,
+        retried: bool = False,
+        throttled: bool = False,
+        failed: bool = False,
+    ) -> None:
+        now = self._clock()
+        with self._lock:
+            metrics = self._metrics.setdefault(endpoint, EndpointMetrics())
+            metrics.waited += waited
+            if started:
+                metrics.requests += 1
+                if metrics.first_request_at is None:
+                    metrics.first_request_at = now
+            else:
+                metrics.last_response_at = now
+            metrics.retries += retried
+            metrics.throttled += throttled
+            metrics.failed += failed
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: for every endpoint contacted so far, requests sent (retries
+            included), retries, 429 answers, requests that failed for good, seconds
+            spent waiting for the rate limit and requests sent per second
+        """
+        with self._lock:
+            return {
+                endpoint: metrics.as_dict() for endpoint, metrics in self._metrics.items()
+            }
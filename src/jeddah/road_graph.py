@@ -0,0 +1,138 @@
+from hashlib import sha1
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from jeddah.point_array import FloatArray, IdArray, PointArray
+from jeddah.road_network import BoolArray, RoadNetwork
+
+
+def chain_key(node_ids: Sequence[int]) -> str:
+    """
+    :param node_ids: OSM ids of the nodes of a chain
+    :return: key of the chain, the same from one run to the next whatever the order
+        chains are found in, from both directions, and for loops from any start
+    """
+    ids = list(node_ids)
+    if len(ids) > 1 and ids[0] == ids[-1]:
+        # a loop can be walked from any of its nodes, it is keyed from its lowest id
+        start = ids.index(min(ids))
+        ids = ids[start:-1] + ids[:start] + [ids[start]]
+    if ids[::-1] < ids:
+        ids.reverse()
+    return sha1(",".join(map(str, ids)).encode("utf-8")).hexdigest()[:16]
+
+
+class RoadGraph:
+    """
+    Undirected graph of road segments. Nodes are the nodes of a RoadNetwork, edges the
+    segments between consecutive nodes of its ways, each segment kept once even when
+    several ways share it.
+    """
+
+    def __init__(
+        self,
+        node_ids: IdArray,
+        latitudes: FloatArray,
+        longitudes: FloatArray,
+        edges: IdArray,
+    ) -> None:
+        """
+        :param node_ids: OSM id of every node
+        :param edges: array of shape (number of edges, 2) of node indexes
+        """
+        self.node_ids = node_ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.edges = edges
+
+        # adjacency in CSR form: the edges touching node n are
+        # node_edges[node_offsets[n]:node_offsets[n + 1]]
+        edge_ends = edges.ravel()
+        self.degrees = np.bincount(edge_ends, minlength=len(latitudes))
+        self.node_offsets = np.zeros(len(latitudes) + 1, dtype=np.int64)
+        np.cumsum(self.degrees, out=self.node_offsets[1:])
+        self.node_edges = np.argsort(edge_ends, kind="stable") // 2
+
+    @classmethod
+    def from_network(
+        cls, network: RoadNetwork, node_mask: Optional[BoolArray] = None
+    ) -> "RoadGraph":
+        """
+        :param node_mask: nodes to keep, segments with a removed end are dropped
+        """
+        way_lengths = np.diff(network.way_offsets)
+        reference_ways = np.repeat(np.arange(len(way_lengths)), way_lengths)
+        starts = network.way_node_indexes[:-1]
+        ends = network.way_node_indexes[1:]
+
+        is_segment = (reference_ways[:-1] == reference_ways[1:]) & (starts != ends)
+        if node_mask is not None:
+            is_segment &= node_mask[starts] & node_mask[ends]
+
+        segments = np.sort(np.stack([starts, ends], axis=1)[is_segment], axis=1)
+        # segments shared by several ways are kept once
+        edges = np.unique(segments, axis=0).reshape(-1, 2).astype(np.int64)
+
+        return cls(network.node_ids, network.latitudes, network.longitudes, edges)
+
+    def chains(self) -> List[List[int]]:
+        """
+        Merges edges into maximal chains: each chain goes from a node that is not a
+        simple continuation of the road (intersection, dead end) to another one, loops
+        without intersection form a closed chain. Every edge belongs to exactly one chain.
+
+        :return: node indexes of every chain
+        """
+        visited = np.zeros(len(self.edges), dtype=bool)
+        chains = []
+
+        chain_ends = np.flatnonzero((self.degrees != 2) & (self.degrees != 0))
+        for node in chain_ends.tolist():
+            for edge in self._edges_of(node):
+                if not visited[edge]:
+                    chains.append(self._walk(node, edge, visited))
+
+        # what remains are loops made of degree 2 nodes only
+        for edge in range(len(self.edges)):
+            if not visited[edge]:
+                chains.append(self._walk(int(self.edges[edge, 0]), edge, visited))
+
+        return chains
+
+    def chain_paths(self) -> Dict[str, PointArray]:
+        """
+        :return: points of every chain, keyed by chain_key, so that a chain keeps its
+            key when the network is loaded again, even if other chains were added
+        """
+        return {
+            chain_key(self.node_ids[chain].tolist()): PointArray(
+                self.latitudes[chain], self.longitudes[chain]
+            )
+            for chain in self.chains()
+        }
+
+    def _edges_of(self, node: int) -> List[int]:
+        edges: List[int] = self.node_edges[
+            self.node_offsets[node] : self.node_offsets[node + 1]
+        ].tolist()
+        return edges
+
+    def _walk(self, start: int, edge: int, visited: BoolArray) -> List[int]:
+        chain = [start]
+        node = start
+        while True:
+            visited[edge] = True
+            first_end, second_end = self.edges[edge].tolist()
+            node = second_end if node == first_end else first_end
+            chain.append(node)
+            if self.degrees[node] != 2:
+                break
+            next_edges = [
+                next_edge for next_edge in self._edges_of(node) if not visited[next_edge]
+            ]
+            if len(next_edges) == 0:
+                # back to the start of a loop
+                break
+            edge = next_edges[0]
+        return chain
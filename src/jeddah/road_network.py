@@ -0,0 +1,314 @@
+from array import array
+import errno
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import tempfile
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+    TextIO,
+)
+
+import numpy as np
+import numpy.typing as npt
+
+from jeddah.point_array import FloatArray, IdArray, PointArray
+
+
+BoolArray = npt.NDArray[np.bool_]
+CodeArray = npt.NDArray[np.uint8]
+
+# version of the files written by RoadNetwork.save, to bump when they change
+FORMAT_VERSION = 1
+NETWORK_ARRAYS = (
+    "node_ids",
+    "latitudes",
+    "longitudes",
+    "way_ids",
+    "way_offsets",
+    "way_node_indexes",
+    "way_highway_codes",
+)
+
+# start of the list of elements in an Overpass JSON response
+ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+# characters read at once from a streamed response
+CHUNK_SIZE = 1 << 16
+
+
+class RoadNetwork:
+    """
+    Road network stored in compact arrays: node ids sorted with their coordinates, and
+    ways as a flat list of node indexes cut by offsets (way i uses the nodes
+    way_node_indexes[way_offsets[i]:way_offsets[i + 1]]). The highway type of way i is
+    highway_types[way_highway_codes[i]].
+    """
+
+    def __init__(
+        self,
+        node_ids: IdArray,
+        latitudes: FloatArray,
+        longitudes: FloatArray,
+        way_ids: IdArray,
+        way_offsets: IdArray,
+        way_node_indexes: IdArray,
+        way_highway_codes: CodeArray,
+        highway_types: Sequence[str],
+    ) -> None:
+        self.node_ids = node_ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.way_ids = way_ids
+        self.way_offsets = way_offsets
+        self.way_node_indexes = way_node_indexes
+        self.way_highway_codes = way_highway_codes
+        self.highway_types = tuple(highway_types)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(getattr(self, name).nbytes) for name in NETWORK_ARRAYS)
+
+    def save(self, directory: Path) -> None:
+        """
+        Writes every array to its own .npy file in the directory, replacing any network
+        saved there before. Files are raw arrays, loaded back without any parsing.
+
+        The arrays are written to a temporary directory renamed into place, so that
+        readers and concurrent writers never see a partly written network. A network
+        already saved there is renamed away first, then deleted.
+        """
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        temporary_directory = Path(
+            tempfile.mkdtemp(
+                prefix=f"{directory.name}.", suffix=".tmp", dir=directory.parent
+            )
+        )
+        np.save(temporary_directory / "format_version.npy", np.array(FORMAT_VERSION))
+        np.save(temporary_directory / "highway_types.npy", np.array(self.highway_types))
+        for name in NETWORK_ARRAYS:
+            np.save(temporary_directory / f"{name}.npy", getattr(self, name))
+
+        stale_directory = temporary_directory.with_name(temporary_directory.name + ".old")
+        while True:
+            try:
+                os.rename(temporary_directory, directory)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+            try:
+                os.rename(directory, stale_directory)
+            except FileNotFoundError:
+                # another writer moved it away first
+                continue
+            shutil.rmtree(stale_directory)
+
+    @classmethod
+    def load(
+        cls, directory: Path, mmap_mode: Optional[Literal["r", "c"]] = "r"
+    ) -> "RoadNetwork":
+        """
+        :param mmap_mode: "r" maps the files in memory instead of reading them: loading
+            is immediate, and processes loading the same network share a single copy
+            through the page cache. None reads the arrays into memory.
+        :raises: ValueError if the network was saved in another format version
+        """
+        format_version = int(np.load(directory / "format_version.npy"))
+        if format_version != FORMAT_VERSION:
+            raise ValueError(
+                f"Road network format {format_version} is not supported, "
+                f"expected {FORMAT_VERSION}"
+            )
+
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in NETWORK_ARRAYS
+        }
+        highway_types = np.load(directory / "highway_types.npy").tolist()
+        return cls(**arrays, highway_types=highway_types)
+
+    def way_highway_type(self, way_index: int) -> str:
+        return self.highway_types[int(self.way_highway_codes[way_index])]
+
+    def way_nodes(self, way_index: int) -> IdArray:
+        """
+        :return: indexes, in the node arrays, of the nodes of a way
+        """
+        return self.way_node_indexes[
+            self.way_offsets[way_index] : self.way_offsets[way_index + 1]
+        ]
+
+    def way_points(self, way_index: int) -> PointArray:
+        node_indexes = self.way_nodes(way_index)
+        return PointArray(self.latitudes[node_indexes], self.longitudes[node_indexes])
+
+
+class RoadNetworkBuilder:
+    """
+    Accumulates Overpass elements one at a time into typed arrays (8 bytes per id or
+    coordinate), in any order and from any number of responses. Nodes and ways are only
+    joined when building the RoadNetwork. Highway types are stored as one byte codes.
+    """
+
+    def __init__(self, accepted_highway_types: AbstractSet[str]) -> None:
+        self.accepted_highway_types = accepted_highway_types
+        self.node_ids = array("q")
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.way_ids = array("q")
+        self.way_lengths = array("q")
+        self.way_node_ids = array("q")
+        self.way_highway_codes = array("B")
+        self.highway_codes: Dict[str, int] = dict()
+
+    def add_element(self, element: Dict[str, Any]) -> None:
+        if element["type"] == "node":
+            self.node_ids.append(int(element["id"]))
+            self.latitudes.append(element["lat"])
+            self.longitudes.append(element["lon"])
+        elif (
+            element["type"] == "way"
+            and element.get("tags", {}).get("highway") in self.accepted_highway_types
+        ):
+            self.way_ids.append(int(element["id"]))
+            self.way_lengths.append(len(element["nodes"]))
+            self.way_highway_codes.append(self.highway_code(element["tags"]["highway"]))
+            self.way_node_ids.extend(int(node_id) for node_id in element["nodes"])
+
+    def add_elements(self, elements: Iterable[Dict[str, Any]]) -> None:
+        for element in elements:
+            self.add_element(element)
+
+    def highway_code(self, highway_type: str) -> int:
+        return self.highway_codes.setdefault(highway_type, len(self.highway_codes))
+
+    def add_network(self, network: RoadNetwork) -> None:
+        """
+        Adds the nodes and ways of an already built network, for instance to merge
+        neighbouring areas. Elements present in both are kept once by build.
+        """
+        self.node_ids.frombytes(network.node_ids.astype(np.int64).tobytes())
+        self.latitudes.frombytes(network.latitudes.astype(np.float64).tobytes())
+        self.longitudes.frombytes(network.longitudes.astype(np.float64).tobytes())
+        self.way_ids.frombytes(network.way_ids.astype(np.int64).tobytes())
+        self.way_lengths.frombytes(
+            np.diff(network.way_offsets).astype(np.int64).tobytes()
+        )
+        self.way_node_ids.frombytes(
+            network.node_ids[network.way_node_indexes].astype(np.int64).tobytes()
+        )
+        # the codes of the network are translated into the codes of the builder
+        highway_codes = np.array(
+            [self.highway_code(highway_type) for highway_type in network.highway_types],
+            dtype=np.uint8,
+        )
+        self.way_highway_codes.frombytes(
+            highway_codes[network.way_highway_codes].tobytes()
+        )
+
+    def build(self) -> RoadNetwork:
+        """
+        Joins way node ids to node coordinates with a binary search over the sorted node
+        ids. Elements received twice are kept once, references to unknown nodes are
+        dropped, and only the nodes used by a way are kept.
+        """
+        node_ids, first_nodes = np.unique(
+            np.frombuffer(self.node_ids, dtype=np.int64), return_index=True
+        )
+        latitudes = np.frombuffer(self.latitudes, dtype=np.float64)[first_nodes]
+        longitudes = np.frombuffer(self.longitudes, dtype=np.float64)[first_nodes]
+
+        way_ids = np.frombuffer(self.way_ids, dtype=np.int64)
+        way_lengths = np.frombuffer(self.way_lengths, dtype=np.int64)
+        way_node_ids = np.frombuffer(self.way_node_ids, dtype=np.int64)
+
+        # a way received several times is kept once, at its first position
+        kept_ways = np.zeros(len(way_ids), dtype=bool)
+        kept_ways[np.unique(way_ids, return_index=True)[1]] = True
+
+        positions = np.searchsorted(node_ids, way_node_ids)
+        if len(node_ids) == 0:
+            found = np.zeros(len(way_node_ids), dtype=bool)
+        else:
+            found = node_ids[np.minimum(positions, len(node_ids) - 1)] == way_node_ids
+        kept_references = np.repeat(kept_ways, way_lengths) & found
+
+        reference_ways = np.repeat(np.arange(len(way_ids)), way_lengths)
+        kept_lengths = np.bincount(
+            reference_ways[kept_references], minlength=len(way_ids)
+        )[kept_ways]
+        way_offsets = np.zeros(len(kept_lengths) + 1, dtype=np.int64)
+        np.cumsum(kept_lengths, out=way_offsets[1:])
+
+        # dropping nodes no way uses, and renumbering the others
+        way_node_indexes = positions[kept_references]
+        used_nodes = np.zeros(len(node_ids), dtype=bool)
+        used_nodes[way_node_indexes] = True
+        new_indexes = np.cumsum(used_nodes) - 1
+
+        return RoadNetwork(
+            node_ids=node_ids[used_nodes],
+            latitudes=latitudes[used_nodes],
+            longitudes=longitudes[used_nodes],
+            way_ids=way_ids[kept_ways].copy(),
+            way_offsets=way_offsets,
+            way_node_indexes=new_indexes[way_node_indexes].astype(np.int64),
+            way_highway_codes=np.frombuffer(self.way_highway_codes, dtype=np.uint8)[
+                kept_ways
+            ].copy(),
+            highway_types=list(self.highway_codes),
+        )
+
+
+def iter_overpass_elements(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the elements of an Overpass JSON response one by one, reading the stream by
+    chunks so that the whole response is never held in memory
+
+    :raises: json.JSONDecodeError if the response is malformed or truncated
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+
+    # skipping everything before the elements list
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        buffer += chunk
+        match = ELEMENTS_START.search(buffer)
+        if match is not None:
+            buffer = buffer[match.end() :]
+            break
+        if not chunk:
+            return
+        # keeping the end, the key might be cut between two chunks
+        buffer = buffer[-32:]
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError("Missing data", buffer, position)
+            element, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield element
@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from jeddah import http_client
+from jeddah.conversion_functions import coords_as_path_str
+from jeddah.point_array import FloatArray, IdArray, PathLike, PointArray, as_point_array
+from settings.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+ROADS_BASE = settings.roads_base
+API_KEY = settings.api_key.get_secret_value()
+
+# the Roads API snaps at most 100 points per request
+WINDOW_SIZE = 100
+# points sent in two consecutive windows, so that the end of a window is snapped
+# knowing where the road goes next
+WINDOW_OVERLAP = 10
+
+# snapped latitudes, longitudes, and for every snapped point the index, in the window,
+# of the point it comes from (interpolated points come from the point before them)
+SnappedWindow = Tuple[FloatArray, FloatArray, IdArray]
+
+
+class SnapCache:
+    """
+    Persistent cache of snapped windows, stored under a hash of the window's points
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    @staticmethod
+    def key(path_str: str) -> str:
+        return sha1(path_str.encode("utf-8")).hexdigest()
+
+    def path_of(self, key: str) -> Path:
+        return self.directory / key[:2] / (key + ".npz")
+
+    def get(self, key: str) -> Optional[SnappedWindow]:
+        cached_path = self.path_of(key)
+        if not cached_path.exists():
+            return None
+        with np.load(cached_path) as arrays:
+            return arrays["latitudes"], arrays["longitudes"], arrays["original_indexes"]
+
+    def put(self, key: str, snapped_window: SnappedWindow) -> None:
+        cached_path = self.path_of(key)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = cached_path.with_name(
+            f"{cached_path.name}.{threading.get_ident()}.tmp"
+        )
+        latitudes, longitudes, original_indexes = snapped_window
+        with temporary_path.open("wb") as file:
+            np.savez(
+                file,
+                latitudes=latitudes,
+                longitudes=longitudes,
+                original_indexes=original_indexes,
+            )
+        os.replace(temporary_path, cached_path)
+
+
+def get_snap_cache() -> Optional[SnapCache]:
+    """
+    Returns the snapped windows cache, None if disabled by snap_cache_enabled
+    """
+    if not settings.snap_cache_enabled:
+        return None
+    directory = settings.snap_cache_directory
+    if directory is None:
+        directory = settings.database_directory / "snap_cache"
+    return SnapCache(directory)
+
+
+def window_bounds(length: int) -> List[Tuple[int, int]]:
+    """
+    :return: start and end indexes of the windows covering a path of the given length,
+        consecutive windows sharing WINDOW_OVERLAP points
+    """
+    if length <= WINDOW_SIZE:
+        return [(0, length)]
+    step = WINDOW_SIZE - WINDOW_OVERLAP
+    starts = range(0, length - WINDOW_OVERLAP, step)
+    return [(start, min(start + WINDOW_SIZE, length)) for start in starts]
+
+
+def snap_window(
+    window: PointArray, snap_cache: Optional[SnapCache] = None
+) -> SnappedWindow:
+    """
+    Snaps at most WINDOW_SIZE points with the Roads API, interpolating along the road.
+    On error, the window is returned unchanged and nothing is cached.
+    """
+    path_str = coords_as_path_str(window)
+    cache_key = SnapCache.key(path_str)
+    if snap_cache is not None:
+        snapped_window = snap_cache.get(cache_key)
+        if snapped_window is not None:
+            return snapped_window
+
+    params = {
+        "key": API_KEY,
+        "path": path_str,
+        "interpolate": "true",
+    }
+    try:
+        response = http_client.get(ROADS_BASE, params=params)
+        response.raise_for_status()
+        snapped_points = response.json()["snappedPoints"]
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logger.warning("Window of %d points not snapped: %s", len(window), e)
+        return window.latitudes, window.longitudes, np.arange(len(window))
+
+    original_indexes = []
+    original_index = 0
+    for snapped_point in snapped_points:
+        original_index = snapped_point.get("originalIndex", original_index)
+        original_indexes.append(original_index)
+    snapped_window = (
+        np.array([point["location"]["latitude"] for point in snapped_points]),
+        np.array([point["location"]["longitude"] for point in snapped_points]),
+        np.array(original_indexes, dtype=np.int64),
+    )
+
+    if snap_cache is not None:
+        snap_cache.put(cache_key, snapped_window)
+    return snapped_window
+
+
+def snap_path(
+    path: PathLike,
+    max_workers: Optional[int] = None,
+    snap_cache: Optional[SnapCache] = None,
+) -> PointArray:
+    """
+    Snaps a path of any length: windows of WINDOW_SIZE points are snapped concurrently,
+    then stitched in the path order. Each window keeps the snapped points coming from
+    the points it owns, the points shared with a neighbouring window being split
+    halfway between the two.
+
+    :param max_workers: defaults to settings.snap_workers
+    """
+    point_array = as_point_array(path)
+    if len(point_array) == 0:
+        return point_array
+    if max_workers is None:
+        max_workers = settings.snap_workers
+
+    bounds = window_bounds(len(point_array))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        snapped_windows = list(
+            executor.map(
+                lambda window: snap_window(
+                    point_array[window[0] : window[1]], snap_cache
+                ),
+                bounds,
+            )
+        )
+
+    stitched_windows = []
+    for window_number, ((start, end), snapped_window) in enumerate(
+        zip(bounds, snapped_windows)
+    ):
+        latitudes, longitudes, original_indexes = snapped_window
+        first_owned = 0 if window_number == 0 else WINDOW_OVERLAP // 2
+        last_owned = end - start
+        if window_number < len(bounds) - 1:
+            last_owned -= WINDOW_OVERLAP - WINDOW_OVERLAP // 2
+        owned = (original_indexes >= first_owned) & (original_indexes < last_owned)
+        stitched_windows.append(PointArray(latitudes[owned], longitudes[owned]))
+
+    return PointArray.concatenate(stitched_windows)
@@ -0,0 +1,97 @@
+import math
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from shapely.geometry import Polygon, box
+
+from jeddah.road_network import RoadNetwork
+from settings.settings import settings
+
+
+# zoom of the slippy map tiles the road network is cached by (about 2.4km wide at the
+# equator, 1.7km at 45 degrees of latitude)
+TILE_ZOOM = 14
+
+Tile = Tuple[int, int]
+
+
+def tile_of(latitude: float, longitude: float, zoom: int = TILE_ZOOM) -> Tile:
+    """
+    :return: x and y of the slippy map tile containing the point
+    """
+    tile_count: int = 2**zoom
+    x = math.floor((longitude + 180) / 360 * tile_count)
+    latitude_radians = math.radians(latitude)
+    y = math.floor(
+        (1 - math.asinh(math.tan(latitude_radians)) / math.pi) / 2 * tile_count
+    )
+    return min(max(x, 0), tile_count - 1), min(max(y, 0), tile_count - 1)
+
+
+def tile_polygon(tile: Tile, zoom: int = TILE_ZOOM) -> Polygon:
+    """
+    :return: polygon of the tile, in (longitude, latitude) coordinates
+    """
+    tile_count: int = 2**zoom
+    x, y = tile
+
+    def longitude_of(x: int) -> float:
+        return x / tile_count * 360 - 180
+
+    def latitude_of(y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / tile_count))))
+
+    return box(longitude_of(x), latitude_of(y + 1), longitude_of(x + 1), latitude_of(y))
+
+
+def tiles_covering(polygon: Polygon, zoom: int = TILE_ZOOM) -> List[Tile]:
+    """
+    :return: tiles intersecting the polygon
+    """
+    west, south, east, north = polygon.bounds
+    min_x, min_y = tile_of(north, west, zoom)
+    max_x, max_y = tile_of(south, east, zoom)
+    return [
+        (x, y)
+        for x in range(min_x, max_x + 1)
+        for y in range(min_y, max_y + 1)
+        if tile_polygon((x, y), zoom).intersects(polygon)
+    ]
+
+
+class RoadTileCache:
+    """
+    Road networks stored per tile, so that any polygon over an already downloaded area
+    is served from disk, whatever its exact position
+    """
+
+    def __init__(self, directory: Path, zoom: int = TILE_ZOOM) -> None:
+        self.directory = directory
+        self.zoom = zoom
+
+    def path_of(self, tile: Tile) -> Path:
+        x, y = tile
+        return self.directory / str(self.zoom) / str(x) / str(y)
+
+    def load(self, tile: Tile) -> Optional[RoadNetwork]:
+        """
+        :return: cached network of the tile, None if the tile was never downloaded or
+            was saved in an older format
+        """
+        tile_path = self.path_of(tile)
+        if not (tile_path / "format_version.npy").exists():
+            return None
+        try:
+            return RoadNetwork.load(tile_path)
+        except ValueError:
+            return None
+
+    def save(self, tile: Tile, network: RoadNetwork) -> None:
+        network.save(self.path_of(tile))
+
+
+def get_road_tile_cache() -> RoadTileCache:
+    directory = settings.road_tile_cache_directory
+    if directory is None:
+        directory = settings.database_directory / "road_tiles"
+    return RoadTileCache(directory)
@@ -0,0 +1,115 @@
+from collections import defaultdict
+import math
+import threading
+from typing import DefaultDict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from jeddah.create_path import EARTH_RADIUS_IN_KILOMETERS, haversine_distances
+from jeddah.point_array import PathKey, PathLike, PointArray, as_point_array
+
+
+# requests made for each sample point: one metadata lookup and two side images
+REQUESTS_PER_POINT = 3
+
+Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    """
+    Grid of square cells, threshold meters wide, holding the points kept so far. A new
+    point only needs to be compared with the points of its cell and of the 8 cells
+    around it. Paths can be added from several threads.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.kept = 0
+        self.dropped = 0
+        self._cells: DefaultDict[Cell, List[Tuple[float, float]]] = defaultdict(list)
+        # cos of the latitude of the first point, to turn longitudes into meters
+        self._longitude_scale: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def requests_saved(self) -> int:
+        return self.dropped * REQUESTS_PER_POINT
+
+    def cell_of(self, latitude: float, longitude: float) -> Cell:
+        if self._longitude_scale is None:
+            self._longitude_scale = math.cos(math.radians(latitude))
+        meters_per_degree = EARTH_RADIUS_IN_KILOMETERS * 1000 * math.pi / 180
+        y = latitude * meters_per_degree
+        x = longitude * meters_per_degree * self._longitude_scale
+        return math.floor(x / self.threshold), math.floor(y / self.threshold)
+
+    def is_near(self, latitude: float, longitude: float) -> bool:
+        """
+        :return: True if a kept point is closer than the threshold
+        """
+        cell_x, cell_y = self.cell_of(latitude, longitude)
+        neighbours = [
+            coordinates
+            for delta_x in (-1, 0, 1)
+            for delta_y in (-1, 0, 1)
+            for coordinates in self._cells.get((cell_x + delta_x, cell_y + delta_y), [])
+        ]
+        if len(neighbours) == 0:
+            return False
+        latitudes, longitudes = np.array(neighbours).T
+        distances = haversine_distances(latitude, longitude, latitudes, longitudes)
+        return bool(np.any(distances < self.threshold))
+
+    def add_path(self, path: PathLike) -> PointArray:
+        """
+        Drops the points of the path closer than the threshold to a point kept from a
+        previous path, then keeps the remaining ones. Points of a single path are not
+        compared with each other, pruning already spaced them.
+
+        :return: points of the path that were kept
+        """
+        path = as_point_array(path)
+        with self._lock:
+            return self._add_path(path)
+
+    def _add_path(self, path: PointArray) -> PointArray:
+        coordinates = list(path.coordinates())
+        is_kept = np.array(
+            [
+                not self.is_near(latitude, longitude)
+                for latitude, longitude in coordinates
+            ],
+            dtype=bool,
+        )
+        for (latitude, longitude), kept in zip(coordinates, is_kept.tolist()):
+            if kept:
+                self._cells[self.cell_of(latitude, longitude)].append(
+                    (latitude, longitude)
+                )
+
+        self.kept += int(is_kept.sum())
+        self.dropped += len(path) - int(is_kept.sum())
+        return path[is_kept]
+
+
+def deduplicate_paths(
+    paths: Iterable[Tuple[PathKey, PathLike]],
+    threshold: float,
+    spatial_index: Optional[SpatialIndex] = None,
+) -> Iterator[Tuple[PathKey, PointArray]]:
+    """
+    Removes, across paths, the points closer than the threshold to a point of a path
+    seen before (crossroads, dual carriageways). Paths left without any point are
+    removed. Paths are deduplicated one after the other, in the given order, so that
+    the same paths always keep the same points.
+
+    :param spatial_index: index to reuse, to deduplicate against already kept points
+    :return: every path left with points, with its key
+    """
+    if spatial_index is None:
+        spatial_index = SpatialIndex(threshold)
+
+    for path_key, path in paths:
+        kept_points = spatial_index.add_path(path)
+        if len(kept_points) > 0:
+            yield path_key, kept_points
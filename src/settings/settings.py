@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from pydantic import BaseSettings, Field, SecretStr
 
@@ -14,6 +15,63 @@ class Settings(BaseSettings):
     # Api key
     api_key: SecretStr = Field("")
 
+    # HTTP
+    http_pool_connections: int = 10
+    # connections kept per host, defaults to the requests in flight at once, see
+    # http_client.requests_in_flight
+    http_pool_maxsize: Optional[int] = None
+    http_connect_timeout: float = 5
+    http_read_timeout: float = 30
+    # requests per second allowed on each Google endpoint
+    street_view_qps: float = 50
+    street_view_metadata_qps: float = 50
+    static_maps_qps: float = 50
+    roads_qps: float = 50
+    # requests sent at once on an endpoint after a pause
+    rate_limit_burst: int = 10
+    # retries of a request answered with 429 or 5xx, or failing to connect
+    http_max_retries: int = 4
+    # seconds the first retry waits at most, doubled for every following retry
+    http_backoff_base: float = 0.5
+    http_backoff_max: float = 30
+    # requests sent to Google in a run, retries included, None for no limit
+    request_budget: Optional[int] = None
+    # average duration of a request, to estimate how long a run takes
+    estimated_request_seconds: float = 0.3
+
+    # Images
+    image_download_workers: int = 8
+    # defaults to database_directory / "image_cache", 0 bytes disables the cache. Images
+    # are hardlinked into projects, so evicting them does not free their disk space.
+    image_cache_directory: Optional[Path] = None
+    image_cache_max_bytes: int = 2 * 1024**3
+    # images downloaded between two checkpoints recorded in the database
+    checkpoint_batch_size: int = 64
+
+    # Pipeline
+    # items waiting between two stages
+    pipeline_queue_size: int = 32
+    # each one requests the metadata of a path point after point, then its map
+    pipeline_planning_workers: int = 4
+    pipeline_writing_workers: int = 2
+
+    # Batch
+    # width, in meters, of the cells a batch area is split into
+    batch_cell_size: float = 500
+    batch_cell_workers: int = 2
+
+    # Roads
+    # defaults to database_directory / "road_tiles"
+    road_tile_cache_directory: Optional[Path] = None
+    # concurrent Roads API requests when snapping a long path
+    snap_workers: int = 4
+    # defaults to database_directory / "snap_cache"
+    snap_cache_directory: Optional[Path] = None
+    snap_cache_enabled: bool = True
+    # processes filling and pruning paths, 1 processes them in the calling process
+    path_processing_workers: int = 1
+    path_processing_chunk_size: int = 64
+
     # Database
     database_directory: Path = Path("/home/asmkwo/Documents/Upciti/jeddah/database")
 
@@ -22,6 +80,10 @@ class Settings(BaseSettings):
     postgresql_username: str = "postgres"
     postgresql_password: str = "postgres"
     postgresql_port: int = 5432
+    database_echo: bool = False
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_pre_ping: bool = True
 
 
 settings = Settings()
@@ -0,0 +1,49 @@
+import pytest
+
+
+class CheckpointDatabase:
+    """
+    Records what the image downloads write instead of using PostgreSQL
+    """
+
+    def __init__(self, completed_path_keys=(), progress=None):
+        self.completed = set(completed_path_keys)
+        self.progress = progress or dict()
+        self.ingested_paths = []
+        self.downloaded_batches = []
+        self.completed_path_ids = []
+
+    @property
+    def downloaded_img_paths(self):
+        return [
+            img_path for _, img_paths in self.downloaded_batches for img_path in img_paths
+        ]
+
+    @property
+    def downloaded_path_ids(self):
+        return {id_path for id_path, _ in self.downloaded_batches}
+
+    def completed_path_keys(self, name):
+        return self.completed
+
+    def path_progress(self, name, path_key):
+        return self.progress.get(path_key)
+
+    def ingest_path(self, path_row, point_rows, image_rows_per_point):
+        self.ingested_paths.append((path_row, point_rows, image_rows_per_point))
+        return int(path_row["path_key"])
+
+    def mark_images_downloaded(self, id_path, img_paths):
+        self.downloaded_batches.append((id_path, img_paths))
+
+    def mark_path_completed(self, id_path):
+        self.completed_path_ids.append(id_path)
+
+
+@pytest.fixture
+def checkpoint_database():
+    """
+    :return: CheckpointDatabase, to be created with the completed path keys and the
+        progress of started paths of the test
+    """
+    return CheckpointDatabase
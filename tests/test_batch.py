@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+from shapely.geometry import box
+
+from jeddah import batch
+from jeddah.batch import (
+    Circle,
+    circles_node_mask,
+    parse_circle,
+    polygon_node_mask,
+    run_batch,
+    split_into_cells,
+)
+from jeddah.create_path import process_path
+from jeddah.point import Point
+from jeddah.point_array import PointArray
+from settings.settings import settings
+
+from tests.test_road_graph import build_network
+
+
+def test_split_into_cells_gives_each_chain_to_the_cell_of_its_first_point():
+    chains = {
+        "0": PointArray.from_points([Point(48.8600, 2.35), Point(48.8700, 2.35)]),
+        "1": PointArray.from_points([Point(48.8601, 2.35)]),
+        "2": PointArray.from_points([Point(48.8700, 2.35), Point(48.8600, 2.35)]),
+        "3": PointArray.from_points([]),
+    }
+    cells = split_into_cells(chains, cell_size=500, reference_latitude=48.86)
+    assert [[key for key, _ in cell_chains] for cell_chains in cells.values()] == [
+        ["0", "1"],
+        ["2"],
+    ]
+    # cells are sorted from south to north
+    first_cell, second_cell = cells
+    assert first_cell[1] < second_cell[1]
+
+
+def test_circles_node_mask_keeps_nodes_near_any_circle():
+    # nodes 1 to 9 are about 111 meters apart, going north
+    network = build_network({10: list(range(1, 10))})
+    circles = [Circle(Point(48.861, 2.35), 50), Circle(Point(48.869, 2.35), 50)]
+    node_mask = circles_node_mask(network, circles)
+    kept_node_ids = network.node_ids[node_mask].tolist()
+    assert 1 in kept_node_ids and 9 in kept_node_ids
+    assert 5 not in kept_node_ids
+
+
+def test_polygon_node_mask_keeps_nodes_inside_the_polygon():
+    network = build_network({10: list(range(1, 10))})
+    polygon = box(2.34, 48.8625, 2.36, 48.8655)
+    node_mask = polygon_node_mask(network, polygon)
+    assert network.node_ids[node_mask].tolist() == [3, 4, 5]
+
+
+def test_parse_circle():
+    assert parse_circle("48.86,2.35,300") == Circle(Point(48.86, 2.35), 300)
+
+
+def test_run_batch_shares_the_network_and_the_index_between_cells(monkeypatch, tmp_path):
+    # only nodes 1, 2 and 8, 9 are in the circles, 900 meters apart
+    network = build_network({10: [1, 2, 3, 4, 5], 11: [5, 6, 7, 8, 9]})
+    polygons = []
+    collected = []
+    lock = threading.Lock()
+
+    def request_tiled_road_network(polygon, offline=False):
+        polygons.append(polygon)
+        return network
+
+    def collect_paths_images(project_name, paths, database, project_directory):
+        with lock:
+            collected.append((project_directory, list(paths)))
+
+    monkeypatch.setattr(batch, "request_tiled_road_network", request_tiled_road_network)
+    monkeypatch.setattr(batch, "collect_paths_images", collect_paths_images)
+    monkeypatch.setattr(settings, "batch_cell_size", 300)
+
+    spatial_index = run_batch(
+        "project",
+        None,
+        tmp_path,
+        threshold=10,
+        circles=[Circle(Point(48.861, 2.35), 100), Circle(Point(48.869, 2.35), 100)],
+        workers=2,
+    )
+
+    assert len(polygons) == 1
+    assert len(collected) == 2
+    assert spatial_index.kept == sum(
+        len(path) for _, paths in collected for _, path in paths
+    )
+    assert len({directory for directory, _ in collected}) == 2
+    assert all(directory.parent == tmp_path for directory, _ in collected)
+
+
+def test_run_batch_deduplicates_cells_in_their_order(monkeypatch, tmp_path):
+    # the chain from node 1 to the crossroad at node 3 is in the southern cell, the
+    # two chains leaving the crossroad to the north are in the next one
+    network = build_network({10: [1, 2, 3], 11: [3, 4, 5], 12: [3, 9]})
+    monkeypatch.setattr(
+        batch, "request_tiled_road_network", lambda polygon, offline: network
+    )
+    monkeypatch.setattr(settings, "batch_cell_size", 150)
+    runs = []
+    for _ in range(3):
+        collected = dict()
+        lock = threading.Lock()
+
+        def collect_paths_images(project_name, paths, database, project_directory):
+            with lock:
+                collected[project_directory.name] = [len(path) for _, path in paths]
+
+        monkeypatch.setattr(batch, "collect_paths_images", collect_paths_images)
+        run_batch("project", None, tmp_path, 10, polygon=box(2.34, 48.86, 2.36, 48.87))
+        runs.append(collected)
+
+    southern_cell, northern_cell = sorted(runs[0].items(), key=lambda cell: cell[0])
+    southern_chain = PointArray.from_points([Point(48.861, 2.35), Point(48.863, 2.35)])
+    # the southern cell keeps the crossroad, whichever cell finishes first
+    assert southern_cell[1] == [len(process_path(southern_chain, 10))]
+    assert len(northern_cell[1]) == 2
+    assert runs[1] == runs[0] and runs[2] == runs[0]
+
+
+def test_run_batch_raises_errors_of_cells(monkeypatch, tmp_path):
+    network = build_network({10: [1, 2, 3]})
+
+    def collect_paths_images(*args):
+        raise RuntimeError("cell failed")
+
+    monkeypatch.setattr(
+        batch, "request_tiled_road_network", lambda polygon, offline: network
+    )
+    monkeypatch.setattr(batch, "collect_paths_images", collect_paths_images)
+
+    with pytest.raises(RuntimeError):
+        run_batch("project", None, tmp_path, 10, polygon=box(2.34, 48.86, 2.36, 48.87))
@@ -1,4 +1,9 @@
-from jeddah.conversion_functions import coords_as_path_str, create_path, json_as_path
+from jeddah.conversion_functions import (
+    coords_as_arrays,
+    coords_as_path_str,
+    create_path,
+    json_as_path,
+)
 from jeddah.point import Point
 
 
@@ -54,3 +59,10 @@ def test_create_path_transforms_a_google_api_path_into_a_list_of_points():
     path = create_path(path_str)
 
     assert path == expected_path
+
+
+def test_coords_as_arrays_splits_points_into_latitudes_and_longitudes():
+    path = [Point(44.56, 27.83), Point(45.89, 28.12)]
+    latitudes, longitudes = coords_as_arrays(path)
+    assert latitudes.tolist() == [44.56, 45.89]
+    assert longitudes.tolist() == [27.83, 28.12]
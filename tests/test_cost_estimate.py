@@ -0,0 +1,60 @@
+import pytest
+
+from jeddah.cost_estimate import (
+    IMAGES_PER_POINT,
+    CostEstimate,
+    cost_estimate_lines,
+    estimate_project_cost,
+    estimate_seconds,
+)
+from jeddah.point import Point
+from settings.settings import settings
+
+
+def test_estimate_project_cost_counts_requests_after_deduplication():
+    chains = [
+        ("0", [Point(48.8600, 2.35), Point(48.8600, 2.351)]),
+        # the same road, drawn in the other direction
+        ("1", [Point(48.8600, 2.351), Point(48.8600, 2.35)]),
+        ("2", [Point(48.8700, 2.35), Point(48.8700, 2.351)]),
+    ]
+    estimate = estimate_project_cost(chains, threshold=10)
+
+    assert estimate.paths == 2
+    assert estimate.points == 2 * 8
+    assert estimate.requests == {
+        "street_view_metadata": 16,
+        "street_view": IMAGES_PER_POINT * 16,
+        "static_maps": 2,
+        "roads": 0,
+    }
+    assert estimate.total_requests == 16 + 32 + 2
+    assert estimate.seconds > 0
+
+
+def test_estimate_seconds_is_set_by_the_slowest_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, "street_view_qps", 10)
+    monkeypatch.setattr(settings, "street_view_metadata_qps", 1000)
+    monkeypatch.setattr(settings, "image_download_workers", 8)
+    monkeypatch.setattr(settings, "pipeline_planning_workers", 8)
+    monkeypatch.setattr(settings, "estimated_request_seconds", 0.5)
+
+    # limited by the rate: 100 requests at 10 per second
+    assert estimate_seconds({"street_view": 100}) == pytest.approx(10)
+    # limited by the workers: 8 requests every half second
+    assert estimate_seconds(
+        {"street_view": 100, "street_view_metadata": 400}
+    ) == pytest.approx(25)
+
+
+def test_cost_estimate_lines_describe_every_endpoint_and_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "request_budget", 100)
+    estimate = CostEstimate(2, 16, {"street_view_metadata": 16, "street_view": 32}, 90)
+
+    assert cost_estimate_lines(estimate) == [
+        "2 paths, 16 points",
+        "street_view_metadata: 16 requests",
+        "street_view: 32 requests",
+        "48 requests in total, about 1.5 minutes",
+        "request budget: 100",
+    ]
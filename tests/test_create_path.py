@@ -1,15 +1,24 @@
 import math
 
+import numpy as np
+import pytest
 import requests
 
+import jeddah
+from jeddah import http_client
+from jeddah.conversion_functions import coords_as_arrays
 from jeddah.create_path import (
     compute_distance_with_haversine,
-    filling_missing_points,
+    consecutive_distances,
+    distances_to_point,
     get_delta_shift,
     get_heading,
-    interpolate_points,
+    get_headings,
+    great_circle_points,
+    haversine_distances,
     make_a_step_and_snap,
-    prune_point_list_with_threshold,
+    pairwise_distances,
+    resample_path,
     snap_to_road_and_interpolate,
 )
 from jeddah.point import Point
@@ -105,7 +114,8 @@ def test_snap_to_road_and_interpolate_call_works(monkeypatch):
         mock_response.reason = 'OK'
         return mock_response
 
-    monkeypatch.setattr(requests, "get", mock_return)
+    monkeypatch.setattr(http_client, "get", mock_return)
+    monkeypatch.setattr(jeddah.create_path, "get_snap_cache", lambda: None)
 
     point_list = [Point(44.851332, -0.609030), Point(44.850580, -0.606297)]
     expected_point_list = [
@@ -128,75 +138,6 @@ def test_snap_to_road_and_interpolate_call_works(monkeypatch):
     assert point_list_snapped == expected_point_list
 
 
-def test_filling_missing_points_adds_points_between_two_given_points():
-
-    point_list = [Point(44.851332, -0.60903), Point(44.85058, -0.606297)]
-    expected_point_list = [
-        Point(44.851332, -0.60903),
-        Point(44.851332, -0.60903),
-        Point(44.85123541970356, -0.6086751031515364),
-        Point(44.85113883940713, -0.6083202068982047),
-        Point(44.85104225911069, -0.6079653112400017),
-        Point(44.850945678814256, -0.6076104161769247),
-        Point(44.85084909851782, -0.6072555217089703),
-        Point(44.850752518221384, -0.6069006278361359),
-        Point(44.85065593792495, -0.6065457345584181),
-        Point(44.85058, -0.606297),
-    ]
-
-    point_list_filled = filling_missing_points(point_list, 30)
-    assert point_list_filled == expected_point_list
-
-
-def test_filling_missing_points_outputs_points_that_are_not_too_far():
-    point_list = [Point(44.851332, -0.60903), Point(44.85058, -0.606297)]
-    point_list_filled = [
-        Point(44.851332, -0.60903),
-        Point(44.851332, -0.60903),
-        Point(44.85123541970356, -0.6086751031515364),
-        Point(44.85113883940713, -0.6083202068982047),
-        Point(44.85104225911069, -0.6079653112400017),
-        Point(44.850945678814256, -0.6076104161769247),
-        Point(44.85084909851782, -0.6072555217089703),
-        Point(44.850752518221384, -0.6069006278361359),
-        Point(44.85065593792495, -0.6065457345584181),
-        Point(44.85058, -0.606297),
-    ]
-    distance_start_and_end_point = compute_distance_with_haversine(
-        point_list[0], point_list[1]
-    )
-    sum_distance_between_each_point = 0
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[0], point_list_filled[1]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[1], point_list_filled[2]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[2], point_list_filled[3]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[3], point_list_filled[4]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[4], point_list_filled[5]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[5], point_list_filled[6]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[6], point_list_filled[7]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[7], point_list_filled[8]
-    )
-    sum_distance_between_each_point += compute_distance_with_haversine(
-        point_list_filled[8], point_list_filled[9]
-    )
-
-    assert sum_distance_between_each_point <= 2 * distance_start_and_end_point
-
-
 def test_haversine_distance_returns_the_correct_distance_between_two_points():
     point_1, point_2 = Point(44.851332, -0.609030), Point(44.850580, -0.606297)
     measured_distance_between_points_1_and_2 = 231
@@ -204,12 +145,6 @@ def test_haversine_distance_returns_the_correct_distance_between_two_points():
     assert math.isclose(distance, measured_distance_between_points_1_and_2, abs_tol=1)
 
 
-def test_interpolate_points_places_new_points_between_two_others():
-    point_list = [Point(44.851332, -0.609030), Point(44.850580, -0.606297)]
-    list_of_interpolated_points = interpolate_points(point_list[0], point_list[1], 23)
-    assert len(list_of_interpolated_points) == 11
-
-
 def test_get_heading_returns_the_right_direction_2_points_are_pointing_towards():
     expected_heading = 111
     heading = get_heading(Point(44.851332, -0.609030), Point(44.850580, -0.606297))
@@ -236,22 +171,105 @@ def test_get_delta_shift_returns_variations_that_match_the_expected_distance():
     assert distance == expected_distance
 
 
-def test_point_list_with_threshold_retains_points_separated_by_a_certain_distance():
+def test_haversine_distances_matches_the_per_pair_distance():
+    point_1, point_2 = Point(44.851332, -0.609030), Point(44.850580, -0.606297)
+    distances = haversine_distances(
+        np.array([point_1.latitude, point_2.latitude]),
+        np.array([point_1.longitude, point_2.longitude]),
+        point_2.latitude,
+        point_2.longitude,
+    )
+    assert math.isclose(
+        distances[0], compute_distance_with_haversine(point_1, point_2), rel_tol=1e-12
+    )
+    assert distances[1] == 0
+
+
+def test_consecutive_distances_returns_one_distance_per_segment():
+    latitudes = np.array([52.514894, 52.514900, 52.514908])
+    longitudes = np.array([13.391269, 13.391376, 13.391498])
+    distances = consecutive_distances(latitudes, longitudes)
+    assert distances.shape == (2,)
+    assert math.isclose(
+        distances[1],
+        compute_distance_with_haversine(
+            Point(52.514900, 13.391376), Point(52.514908, 13.391498)
+        ),
+    )
 
-    point_list_separated_by_5_meters = [
-        Point(52.514894, 13.391269),
-        Point(52.514900, 13.391376),
-        Point(52.514908, 13.391498),
-        Point(52.514915, 13.391610),
-        Point(52.514923, 13.391728),
-        Point(52.514931, 13.391846),
-        Point(52.514939, 13.391957),
-        Point(52.514942, 13.392021),
-        Point(52.514946, 13.392092),
-    ]
-    threshold = 8
-    expected_remaining_points = 5
-    point_list_thresholded = prune_point_list_with_threshold(
-        point_list_separated_by_5_meters, threshold
+
+def test_distances_to_point_computes_the_distance_of_every_coordinate():
+    center_point = Point(48.858516, 2.348244)
+    latitudes = np.array([48.861872, 48.865976])
+    longitudes = np.array([2.350718, 2.358352])
+    distances = distances_to_point(latitudes, longitudes, center_point)
+    assert math.isclose(
+        distances[1],
+        compute_distance_with_haversine(Point(48.865976, 2.358352), center_point),
+    )
+
+
+def test_pairwise_distances_returns_a_matrix_of_distances():
+    latitudes_1, longitudes_1 = np.array([44.851332, 44.850580]), np.array([-0.6, -0.6])
+    latitudes_2, longitudes_2 = np.array([44.85, 44.86, 44.87]), np.array([-0.6] * 3)
+    distances = pairwise_distances(latitudes_1, longitudes_1, latitudes_2, longitudes_2)
+    assert distances.shape == (2, 3)
+    assert math.isclose(
+        distances[1, 2],
+        compute_distance_with_haversine(Point(44.850580, -0.6), Point(44.87, -0.6)),
+    )
+
+
+def test_great_circle_points_returns_the_start_point_for_a_zero_fraction():
+    latitudes, longitudes = great_circle_points(
+        np.array([44.851332, 44.851332]),
+        np.array([-0.609030, -0.609030]),
+        np.array([44.850580, 44.850580]),
+        np.array([-0.606297, -0.606297]),
+        np.array([0.0, 1.0]),
     )
-    assert len(point_list_thresholded) == expected_remaining_points
+    assert latitudes[0] == 44.851332
+    assert math.isclose(latitudes[1], 44.850580)
+    assert math.isclose(longitudes[1], -0.606297)
+
+
+def test_get_headings_matches_get_heading_for_every_point():
+    path = [
+        Point(44.851332, -0.609030),
+        Point(44.850580, -0.606297),
+        Point(44.851000, -0.606300),
+        Point(44.851000, -0.610000),
+    ]
+    headings = get_headings(path)
+    expected_headings = [get_heading(path[index], path[index + 1]) for index in range(3)]
+    expected_headings.append(get_heading(path[-1], path[-1]))
+    assert headings.tolist() == expected_headings
+
+
+def test_resample_path_places_points_every_threshold_meters_along_the_path():
+    path = [
+        Point(48.866972, 2.356597),
+        Point(48.867252, 2.356781),
+        Point(48.867252, 2.356781),
+        Point(48.867724, 2.354896),
+        Point(48.868157, 2.355126),
+    ]
+    latitudes, longitudes = coords_as_arrays(path)
+    path_length = consecutive_distances(latitudes, longitudes).sum()
+
+    resampled_path = resample_path(path, 10)
+
+    assert len(resampled_path) == int(path_length // 10) + 1
+    assert resampled_path[0] == path[0]
+    # points are 10m apart along the path, a bit less in straight line at corners
+    distances = consecutive_distances(resampled_path.latitudes, resampled_path.longitudes)
+    assert np.all(distances <= 10 + 1e-6)
+    assert np.median(distances) == pytest.approx(10)
+
+
+def test_resample_path_handles_short_paths():
+    assert len(resample_path([], 10)) == 0
+    assert resample_path([Point(48.86, 2.35)], 10) == [Point(48.86, 2.35)]
+    assert resample_path([Point(48.86, 2.35), Point(48.86001, 2.35)], 10) == [
+        Point(48.86, 2.35)
+    ]
@@ -1,9 +1,17 @@
 import pytest
-from sqlalchemy import inspect
+from sqlalchemy import create_engine, inspect, select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import database_exists
 
-from jeddah.database_config import Database, Image, PathForDatabase, PointForDatabase
+import jeddah.database_config
+from jeddah.database_config import (
+    Base,
+    Database,
+    Image,
+    PathForDatabase,
+    PointForDatabase,
+    insert_with_ids,
+)
 
 
 @pytest.fixture
@@ -110,3 +118,153 @@ def test_save_image_saves_image_details_in_database(database, path):
         session.commit()
     finally:
         session.close()
+
+
+@pytest.mark.integtest
+def test_ingest_paths_writes_paths_points_and_images_in_bulk(database):
+    path_row = {
+        "name": "test_path",
+        "client": "test_client",
+        "street": "test_street",
+        "city": "test_city",
+        "country": "swatziland",
+    }
+    point_rows = [
+        {"path_index": 0, "latitude": 45.2, "longitude": 24.3, "pano_id": "pano_1"},
+        {"path_index": 1, "latitude": 15.9, "longitude": 67.3, "pano_id": None},
+    ]
+    image_rows_per_point = [
+        [
+            {"img_path": "image_1", "heading": 120},
+            {"img_path": "image_2", "heading": 300},
+        ],
+        [],
+    ]
+
+    path_ids = database.ingest_paths([(path_row, point_rows, image_rows_per_point)] * 2)
+
+    Session = sessionmaker(database.engine)
+    session = Session()
+    try:
+        assert len(set(path_ids)) == 2
+        assert session.query(PointForDatabase).count() == 4
+        first_point = (
+            session.query(PointForDatabase)
+            .filter(PointForDatabase.id_path == path_ids[1])
+            .filter(PointForDatabase.path_index == 0)
+            .one()
+        )
+        assert [image.img_path for image in first_point.image_relation] == [
+            "image_1",
+            "image_2",
+        ]
+        session.query(Image).delete()
+        session.query(PointForDatabase).delete()
+        session.query(PathForDatabase).delete()
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_databases_share_one_engine_per_url():
+    database_1 = Database(db_name="street_view_db_testing")
+    database_2 = Database(db_name="street_view_db_testing")
+    assert database_1.engine is database_2.engine
+    assert database_1.session_factory is database_2.session_factory
+
+
+def test_engine_does_not_log_statements_by_default():
+    database = Database(db_name="street_view_db_testing")
+    assert database.engine.echo is False
+
+
+def test_insert_with_ids_gives_each_row_its_reserved_id(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(engine.dialect, "supports_sequences", True)
+    # reserved ids do not have to be in increasing order
+    monkeypatch.setattr(
+        jeddah.database_config,
+        "reserve_ids",
+        lambda connection, sequence, count: [7, 3][:count],
+    )
+    path_rows = [{"name": "first_path"}, {"name": "second_path"}]
+
+    with engine.begin() as connection:
+        ids = insert_with_ids(connection, PathForDatabase.__table__, path_rows)
+        names = dict(
+            connection.execute(
+                select(PathForDatabase.id_path, PathForDatabase.name)
+            ).all()
+        )
+
+    assert ids == [7, 3]
+    assert names == {7: "first_path", 3: "second_path"}
+
+
+def test_mark_images_downloaded_only_marks_the_images_of_the_path():
+    database = Database.__new__(Database)
+    database.engine = create_engine("sqlite://")
+    database.session_factory = sessionmaker(database.engine)
+    Base.metadata.create_all(database.engine)
+    point_rows = [{"path_index": 0, "latitude": 45.2, "longitude": 24.3}]
+    image_rows_per_point = [
+        [{"img_path": "image_1", "heading": 120, "downloaded": False}]
+    ]
+    # two paths of different projects store an image under the same file path
+    id_path = database.ingest_path(
+        {"name": "first_project", "path_key": "3"}, point_rows, image_rows_per_point
+    )
+    database.ingest_path(
+        {"name": "second_project", "path_key": "3"}, point_rows, image_rows_per_point
+    )
+
+    database.mark_images_downloaded(id_path, ["image_1"])
+
+    assert database.path_progress("first_project", "3").pending_images == []
+    assert len(database.path_progress("second_project", "3").pending_images) == 1
+
+
+@pytest.mark.integtest
+def test_session_scope_rolls_back_when_the_block_raises(database, path):
+    with pytest.raises(ValueError):
+        with database.session_scope() as session:
+            session.add(path)
+            session.flush()
+            raise ValueError("failing unit of work")
+
+    with database.session_scope() as session:
+        assert session.query(PathForDatabase).count() == 0
+
+
+@pytest.mark.integtest
+def test_path_progress_lists_the_images_left_to_download(database):
+    path_row = {"name": "test_project", "path_key": "3", "completed": False}
+    point_rows = [
+        {"path_index": 0, "latitude": 45.2, "longitude": 24.3},
+        {"path_index": 1, "latitude": 45.3, "longitude": 24.4},
+    ]
+    image_rows_per_point = [
+        [
+            {"img_path": "image_1", "heading": 120, "downloaded": False},
+            {"img_path": "image_2", "heading": 300, "downloaded": False},
+        ],
+        [{"img_path": "image_1", "heading": 120, "downloaded": False}],
+    ]
+    id_path = database.ingest_path(path_row, point_rows, image_rows_per_point)
+
+    assert database.path_progress("test_project", "4") is None
+    database.mark_images_downloaded(id_path, ["image_1"])
+    progress = database.path_progress("test_project", "3")
+    assert progress.id_path == id_path
+    assert not progress.completed
+    assert [image.img_path for image in progress.pending_images] == ["image_2"]
+
+    assert database.completed_path_keys("test_project") == set()
+    database.mark_path_completed(id_path)
+    assert database.completed_path_keys("test_project") == {"3"}
+
+    with database.session_scope() as session:
+        session.query(Image).delete()
+        session.query(PointForDatabase).delete()
+        session.query(PathForDatabase).delete()
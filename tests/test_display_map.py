@@ -3,6 +3,7 @@ from pathlib import Path
 
 import requests
 
+from jeddah import http_client
 from jeddah.create_path import create_path
 from jeddah.display_map import get_map, save_map
 
@@ -40,7 +41,7 @@ def test_get_map_effectively_returns_a_map_image(monkeypatch):
         mock_response.reason = "OK"
         return mock_response
 
-    monkeypatch.setattr(requests, "get", mock_return)
+    monkeypatch.setattr(http_client, "get", mock_return)
 
     response = get_map(point_list)
     expected_type = "image/png"
@@ -55,3 +56,18 @@ def test_save_map():
     map_path = DATABASE_DIRECTORY / "map.png"
     assert map_path.is_file()
     os.remove(str(map_path))  # temporary
+
+
+def test_error_responses_are_not_saved_as_maps(monkeypatch, tmp_path):
+    def mock_return(link_base_for_api, params):
+        mock_response = requests.Response()
+        mock_response.status_code = 403
+        mock_response.reason = "Forbidden"
+        mock_response._content = b"The Google Maps Platform server rejected your request"
+        mock_response._content_consumed = True
+        return mock_response
+
+    monkeypatch.setattr(http_client, "get", mock_return)
+
+    assert not save_map(point_list, tmp_path)
+    assert list(tmp_path.iterdir()) == []
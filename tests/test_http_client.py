@@ -0,0 +1,69 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+from jeddah import http_client
+from settings.settings import settings
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    http_client.close_session()
+    server.shutdown()
+
+
+def test_get_session_returns_the_same_session_every_time():
+    assert http_client.get_session() is http_client.get_session()
+    http_client.close_session()
+
+
+def test_get_session_pools_a_connection_per_request_in_flight(monkeypatch):
+    monkeypatch.setattr(settings, "http_pool_maxsize", None)
+    monkeypatch.setattr(settings, "pipeline_planning_workers", 4)
+    monkeypatch.setattr(settings, "image_download_workers", 8)
+    monkeypatch.setattr(settings, "batch_cell_workers", 2)
+
+    adapter = http_client.get_session().get_adapter("https://")
+
+    # the planning and download workers of the pipelines of two batch cells
+    assert adapter._pool_maxsize == 24
+    http_client.close_session()
+
+
+def test_get_reuses_the_pooled_connection(local_server):
+    for _ in range(5):
+        response = http_client.get(local_server, params={"test": 1})
+        assert response.content == b"ok"
+
+    stats = http_client.connection_stats()["http://127.0.0.1"]
+    assert stats["requests"] == 5
+    assert stats["connections"] == 1
+    assert stats["reused"] == 4
+
+
+def test_get_counts_requests_per_endpoint(local_server):
+    http_client.get(local_server)
+    scheduler = http_client.get_scheduler()
+    assert scheduler.endpoint_of(settings.pic_base) == "street_view"
+    assert scheduler.endpoint_of(settings.roads_base) == "roads"
+    endpoint = urlsplit(local_server).netloc
+    assert http_client.request_metrics()[endpoint]["requests"] >= 1
@@ -0,0 +1,79 @@
+import os
+
+from jeddah.image_cache import ImageCache
+
+
+def test_key_ignores_the_api_key_and_float_formatting():
+    params_1 = {"key": "secret_1", "location": "44.85,-0.6", "heading": 100}
+    params_2 = {"heading": "100", "location": "44.8500000,-0.60", "key": "secret_2"}
+    params_3 = {"key": "secret_1", "location": "44.85,-0.6", "heading": 101}
+    assert ImageCache.key(params_1) == ImageCache.key(params_2)
+    assert ImageCache.key(params_1) != ImageCache.key(params_3)
+
+
+def test_get_counts_hits_and_misses(tmp_path):
+    image_cache = ImageCache(tmp_path, max_bytes=1000)
+    key = ImageCache.key({"location": "44.85,-0.6"})
+    assert image_cache.get(key) is None
+
+    image_cache.put(key, b"image")
+
+    assert image_cache.get(key).read_bytes() == b"image"
+    assert (image_cache.hits, image_cache.misses) == (1, 1)
+
+
+def test_link_into_hardlinks_the_cached_image(tmp_path):
+    image_cache = ImageCache(tmp_path / "cache", max_bytes=1000)
+    key = ImageCache.key({"location": "44.85,-0.6"})
+    image_cache.put(key, b"image")
+    destination = tmp_path / "image_point_0_90.jpg"
+
+    image_cache.link_into(key, destination)
+
+    assert destination.read_bytes() == b"image"
+    assert os.stat(destination).st_ino == os.stat(image_cache.path_of(key)).st_ino
+
+
+def test_put_evicts_the_least_recently_used_images_below_max_bytes(tmp_path):
+    image_cache = ImageCache(tmp_path, max_bytes=20)
+    keys = [ImageCache.key({"heading": heading}) for heading in range(5)]
+    for key in keys[:4]:
+        image_cache.put(key, b"12345")
+    image_cache.get(keys[0])
+
+    image_cache.put(keys[4], b"12345")
+
+    # evicted down to 18 bytes, the first image was used again
+    assert [image_cache.path_of(key).exists() for key in keys] == [
+        True,
+        False,
+        False,
+        True,
+        True,
+    ]
+    assert image_cache._current_size() == 15
+
+
+def test_evicts_images_of_a_previous_run_by_modification_time(tmp_path):
+    previous_cache = ImageCache(tmp_path, max_bytes=12)
+    keys = [ImageCache.key({"heading": heading}) for heading in range(3)]
+    previous_cache.put(keys[0], b"12345")
+    previous_cache.put(keys[1], b"12345")
+    os.utime(previous_cache.path_of(keys[0]), (2, 2))
+    os.utime(previous_cache.path_of(keys[1]), (1, 1))
+
+    image_cache = ImageCache(tmp_path, max_bytes=12)
+    image_cache.put(keys[2], b"12345")
+
+    assert image_cache.path_of(keys[0]).exists()
+    assert not image_cache.path_of(keys[1]).exists()
+    assert image_cache.path_of(keys[2]).exists()
+
+
+def test_put_counts_each_image_once(tmp_path):
+    image_cache = ImageCache(tmp_path, max_bytes=100)
+    key = ImageCache.key({"heading": 0})
+    image_cache.put(key, b"12345")
+    image_cache.put(key, b"12345")
+
+    assert image_cache._current_size() == 5
@@ -0,0 +1,47 @@
+from typer.testing import CliRunner
+
+import jeddah.main
+from jeddah.main import add_path, app
+
+
+class CompletionDatabase:
+    def __init__(self):
+        self.completed = []
+
+    def setup(self):
+        pass
+
+    def mark_path_completed(self, id_path):
+        self.completed.append(id_path)
+
+
+def test_add_path_is_only_completed_when_no_image_failed(monkeypatch, tmp_path):
+    database = CompletionDatabase()
+    failed_per_call = iter([2, 0])
+    monkeypatch.setattr(jeddah.main, "DATABASE_DIRECTORY", tmp_path)
+    monkeypatch.setattr(jeddah.main, "Database", lambda: database)
+    monkeypatch.setattr(jeddah.main, "save_map", lambda path, directory: True)
+    monkeypatch.setattr(
+        jeddah.main,
+        "get_images_along_path",
+        lambda *args: (4, next(failed_per_call)),
+    )
+    path = "48.860597,2.349461|48.862039,2.350262"
+
+    add_path("test_project", path)
+    assert database.completed == []
+
+    add_path("test_project", path)
+    assert database.completed == [4]
+
+
+def test_dry_run_without_cached_tiles_exits_with_an_error(monkeypatch):
+    def mock_return(center_point, radius, offline):
+        raise FileNotFoundError("Road network of tile (1, 2) is not cached")
+
+    monkeypatch.setattr(jeddah.main, "road_chains_from_point", mock_return)
+
+    result = CliRunner().invoke(app, ["test_project", "48.86", "2.35", "--dry-run"])
+
+    assert result.exit_code == 1
+    assert "run once online" in result.output
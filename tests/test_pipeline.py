@@ -0,0 +1,214 @@
+from pathlib import Path
+import threading
+
+import pytest
+import requests
+
+import jeddah
+from jeddah.database_config import PathProgress
+from jeddah.pipeline import Pipeline, collect_project_images
+from jeddah.point import Point
+from jeddah.request_scheduler import RequestBudgetExceeded
+from jeddah.spatial_index import SpatialIndex
+
+
+def test_pipeline_runs_items_through_every_stage_in_order():
+    results = []
+
+    def collect(number):
+        results.append(number)
+        return []
+
+    pipeline = (
+        Pipeline(range(100), queue_size=2)
+        .add_stage("double", lambda number: [number, number])
+        .add_stage("odd", lambda number: [number] if number % 2 else [])
+        .add_stage("collect", collect)
+    )
+
+    pipeline.run()
+
+    assert results == [number for number in range(100) if number % 2 for _ in range(2)]
+    assert pipeline.processed == {"double": 100, "odd": 200, "collect": 100}
+
+
+def test_pipeline_runs_workers_of_a_stage_concurrently():
+    barrier = threading.Barrier(4, timeout=5)
+
+    def wait_for_the_other_workers(number):
+        barrier.wait()
+        return [number]
+
+    pipeline = Pipeline(range(8), queue_size=1).add_stage(
+        "wait", wait_for_the_other_workers, workers=4
+    )
+    pipeline.run()
+
+    assert pipeline.processed["wait"] == 8
+
+
+def test_pipeline_raises_the_first_error_after_stopping_every_stage():
+    def fail_on_ten(number):
+        if number == 10:
+            raise ValueError("failing stage")
+        return [number]
+
+    pipeline = (
+        Pipeline(range(1000), queue_size=2)
+        .add_stage("fail", fail_on_ten, workers=2)
+        .add_stage("drop", lambda number: [])
+    )
+    with pytest.raises(ValueError):
+        pipeline.run()
+    assert pipeline.processed["fail"] < 1000
+
+
+def test_pipeline_stages_after_a_failed_stage_finish_its_outputs():
+    results = []
+
+    def fail_on_ten(number):
+        if number == 10:
+            raise ValueError("failing stage")
+        return [number]
+
+    def collect(number):
+        results.append(number)
+        return []
+
+    pipeline = (
+        Pipeline(range(1000), queue_size=2)
+        .add_stage("fail", fail_on_ten)
+        .add_stage("collect", collect)
+    )
+    with pytest.raises(ValueError):
+        pipeline.run()
+    assert results == list(range(10))
+
+
+def test_collect_project_images_skips_completed_paths_and_resumes_started_ones(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    requested = []
+
+    def mock_return(point, heading):
+        requested.append((point, heading))
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = b"jpeg"
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    monkeypatch.setattr(
+        jeddah.request_images,
+        "get_pano_ids",
+        lambda path, max_workers=None: [str(point) for point in path],
+    )
+    monkeypatch.setattr(jeddah.pipeline, "save_map", lambda path, directory: None)
+    monkeypatch.setattr(jeddah.pipeline.settings, "checkpoint_batch_size", 3)
+
+    chains = [
+        (str(key), [Point(48.86 + key * 0.001, 2.35), Point(48.86 + key * 0.001, 2.351)])
+        for key in range(4)
+    ]
+    database = checkpoint_database(
+        completed_path_keys={"1"}, progress={"2": PathProgress(2, False, [])}
+    )
+    spatial_index = SpatialIndex(threshold=10)
+
+    pipeline = collect_project_images(
+        "test_project", chains, 10, database, tmp_path, spatial_index
+    )
+
+    assert pipeline.processed["plan"] == 3
+    assert [row["path_key"] for row, _, _ in database.ingested_paths] == ["0", "3"]
+    assert sorted(database.completed_path_ids) == [0, 2, 3]
+    # 8 points on each of the two new paths, two side images per point
+    assert len(requested) == 2 * 8 * 2
+    assert sorted(database.downloaded_img_paths) == sorted(
+        {str(image_path) for image_path in tmp_path.glob("*/*.jpg")}
+    )
+    assert database.downloaded_path_ids == {0, 3}
+    # images are stored in the directory of their path, named after its key
+    assert all(
+        Path(img_path).parent.name == str(id_path)
+        for id_path, img_paths in database.downloaded_batches
+        for img_path in img_paths
+    )
+    # the completed path still counts for deduplication
+    assert spatial_index.kept == 4 * 8
+
+
+def test_collect_project_images_leaves_paths_with_failed_images_started(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    def mock_return(point, heading):
+        mock_response = requests.Response()
+        mock_response.status_code = 503 if point == Point(48.86, 2.35) else 200
+        mock_response._content = b"jpeg"
+        mock_response._content_consumed = True
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    monkeypatch.setattr(
+        jeddah.request_images,
+        "get_pano_ids",
+        lambda path, max_workers=None: [str(point) for point in path],
+    )
+    monkeypatch.setattr(jeddah.pipeline, "save_map", lambda path, directory: None)
+
+    chains = [
+        ("0", [Point(48.86, 2.35), Point(48.86, 2.351)]),
+        ("1", [Point(48.87, 2.35), Point(48.87, 2.351)]),
+    ]
+    database = checkpoint_database()
+
+    collect_project_images("test_project", chains, 10, database, tmp_path)
+
+    assert database.completed_path_ids == [1]
+    # the two side images of the first point were not written
+    assert len(database.downloaded_img_paths) == 2 * 8 * 2 - 2
+    assert len(list(tmp_path.glob("*/*.jpg"))) == 2 * 8 * 2 - 2
+
+
+def test_collect_project_images_records_written_images_when_a_fetch_fails(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    requested = []
+
+    def mock_return(point, heading):
+        if len(requested) == 5:
+            raise RequestBudgetExceeded("budget spent")
+        requested.append((point, heading))
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = b"jpeg"
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    monkeypatch.setattr(
+        jeddah.request_images,
+        "get_pano_ids",
+        lambda path, max_workers=None: [str(point) for point in path],
+    )
+    monkeypatch.setattr(jeddah.pipeline, "save_map", lambda path, directory: None)
+    monkeypatch.setattr(jeddah.pipeline.settings, "image_download_workers", 1)
+    monkeypatch.setattr(jeddah.pipeline.settings, "checkpoint_batch_size", 1000)
+    database = checkpoint_database()
+
+    with pytest.raises(RequestBudgetExceeded):
+        collect_project_images(
+            "test_project",
+            [("0", [Point(48.86, 2.35), Point(48.86, 2.351)])],
+            10,
+            database,
+            tmp_path,
+        )
+
+    assert database.completed_path_ids == []
+    assert len(database.downloaded_img_paths) == 5
+    assert sorted(database.downloaded_img_paths) == sorted(
+        str(image_path) for image_path in tmp_path.glob("*/*.jpg")
+    )
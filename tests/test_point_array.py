@@ -0,0 +1,58 @@
+import numpy as np
+
+from jeddah.point import Point
+from jeddah.point_array import PointArray, as_point_array, pack_paths, unpack_paths
+
+
+def test_from_points_stores_coordinates_in_float64_arrays():
+    point_array = PointArray.from_points([Point(44.56, 27.83), Point(45.89, 28.12)])
+    assert point_array.latitudes.dtype == np.float64
+    assert point_array.longitudes.tolist() == [27.83, 28.12]
+    assert point_array.nbytes == 2 * 16
+
+
+def test_getitem_returns_a_point_for_an_index_and_a_view_for_a_slice():
+    point_array = PointArray([44.56, 45.89, 47.63], [27.83, 28.12, 29.35])
+    assert point_array[1] == Point(45.89, 28.12)
+    assert point_array[-1] == Point(47.63, 29.35)
+
+    sliced = point_array[1:]
+    assert isinstance(sliced, PointArray)
+    assert np.shares_memory(sliced.latitudes, point_array.latitudes)
+    assert sliced == [Point(45.89, 28.12), Point(47.63, 29.35)]
+
+
+def test_concatenate_joins_paths_in_order():
+    path_1 = PointArray([44.56], [27.83])
+    path_2 = PointArray([45.89, 47.63], [28.12, 29.35])
+    joined = path_1 + path_2
+    assert joined == [Point(44.56, 27.83), Point(45.89, 28.12), Point(47.63, 29.35)]
+    assert PointArray.concatenate([]) == []
+
+
+def test_iteration_yields_points():
+    point_array = PointArray([44.56, 45.89], [27.83, 28.12])
+    assert [str(point) for point in point_array] == ["44.56,27.83", "45.89,28.12"]
+
+
+def test_as_point_array_keeps_point_arrays_as_they_are():
+    point_array = PointArray([44.56], [27.83])
+    assert as_point_array(point_array) is point_array
+    assert as_point_array([Point(44.56, 27.83)]) == point_array
+
+
+def test_point_uses_slots():
+    point = Point(44.56, 27.83)
+    assert not hasattr(point, "__dict__")
+
+
+def test_unpack_paths_gives_back_packed_paths():
+    paths = [
+        PointArray([1.0, 2.0], [3.0, 4.0]),
+        PointArray.empty(),
+        PointArray([5.0], [6.0]),
+    ]
+    latitudes, longitudes, offsets = pack_paths(paths)
+
+    assert offsets.tolist() == [0, 2, 2, 3]
+    assert unpack_paths(latitudes, longitudes, offsets) == paths
@@ -1,16 +1,26 @@
+import json
 import math
+from pathlib import Path
 
-from osmnx import downloader
+from osmnx import downloader, settings as ox_settings
+import pytest
+import requests
 from shapely.geometry import Polygon
 
 import jeddah
 from jeddah.point import Point
 from jeddah.request_daedal import (
-    complete_all_paths,
+    OverpassError,
     create_polygon,
-    keep_points_within_radius,
-    request_nodes_and_paths,
+    download_overpass_response,
+    iter_completed_paths,
+    request_road_network,
+    request_tiled_road_network,
 )
+from jeddah.road_network import RoadNetworkBuilder
+from jeddah.road_tiles import RoadTileCache, tile_polygon
+
+from tests.test_road_network import nodes_and_paths
 
 
 def test_create_polygon_returns_the_expected_polygon():
@@ -195,46 +205,12 @@ def test_request_path_and_nodes_returns_the_expected_dictionary(monkeypatch):
         ],
     }
 
-    nodes, paths = request_nodes_and_paths(polygon)
+    nodes, paths = nodes_and_paths(request_road_network(polygon))
     assert nodes == expected_nodes
     assert paths == expected_paths
 
 
-def test_keep_points_within_radius_effectively_keeps_points_within():
-
-    radius = 550
-    center_point = Point(48.858516, 2.348244)
-
-    nodes = {
-        1: Point(48.861872, 2.350718),
-        2: Point(48.861982, 2.350205),
-        3: Point(48.862786, 2.350638),
-        4: Point(48.863365, 2.350958),
-        5: Point(48.864484, 2.351608),
-        6: Point(48.864861, 2.353372),
-        7: Point(48.865362, 2.355636),
-        8: Point(48.865976, 2.358352),
-        9: Point(48.860222, 2.350792),
-    }
-
-    paths = {10: [1, 2, 3, 4, 5, 6, 7, 8, 9]}
-
-    expected_path = {
-        10: [
-            Point(48.861872, 2.350718),
-            Point(48.861982, 2.350205),
-            Point(48.862786, 2.350638),
-            Point(48.863365, 2.350958),
-            Point(48.860222, 2.350792),
-        ]
-    }
-
-    path_in_radius = keep_points_within_radius(center_point, radius, nodes, paths)
-
-    assert path_in_radius == expected_path
-
-
-def test_complete_all_paths_completes_all_paths(monkeypatch):
+def test_iter_completed_paths_completes_all_paths(monkeypatch):
     def mock_return(point_list, threshold):
         mock_response = [
             Point(48.866972, 2.356597),
@@ -271,6 +247,157 @@ def test_complete_all_paths_completes_all_paths(monkeypatch):
         ]
     }
 
-    point_list_filled = complete_all_paths(path_to_fill, threshold=10)
+    point_list_filled = dict(iter_completed_paths(path_to_fill.items(), threshold=10))
 
     assert point_list_filled == expected_path_filled
+
+
+def test_request_road_network_streams_the_same_network_as_osmnx(monkeypatch):
+    cache_file = (
+        Path(jeddah.__file__).parent
+        / "cache"
+        / "06929bc4d24d34e905b77ee6c82834c99424428a.json"
+    )
+
+    def mock_download(polygon, network_type, custom_filter):
+        return [json.loads(cache_file.read_text(encoding="utf-8"))]
+
+    monkeypatch.setattr(downloader, "_osm_network_download", mock_download)
+    monkeypatch.setattr(
+        downloader, "_make_overpass_polygon_coord_strs", lambda polygon: ["coords"]
+    )
+    monkeypatch.setattr(
+        jeddah.request_daedal, "download_overpass_response", lambda data: cache_file
+    )
+
+    network = request_road_network(Polygon(), stream=False)
+    streamed_network = request_road_network(Polygon(), stream=True)
+
+    assert nodes_and_paths(streamed_network) == nodes_and_paths(network)
+    assert len(network.way_ids) == 56
+
+
+def test_request_tiled_road_network_only_downloads_missing_tiles(monkeypatch, tmp_path):
+    downloaded_tiles = []
+
+    def mock_request_road_network(polygon, stream=False):
+        downloaded_tiles.append(polygon.bounds)
+        west, south, east, north = polygon.bounds
+        builder = RoadNetworkBuilder(frozenset(["residential"]))
+        builder.add_elements(
+            [
+                {"type": "node", "id": 1, "lat": south, "lon": west},
+                {"type": "node", "id": int(east * 1e6), "lat": north, "lon": east},
+                {
+                    "type": "way",
+                    "id": int(west * 1e6),
+                    "nodes": [1, int(east * 1e6)],
+                    "tags": {"highway": "residential"},
+                },
+            ]
+        )
+        return builder.build()
+
+    monkeypatch.setattr(
+        jeddah.request_daedal, "request_road_network", mock_request_road_network
+    )
+    tile_cache = RoadTileCache(tmp_path)
+    west, south, east, north = tile_polygon((8299, 5636)).bounds
+
+    network = request_tiled_road_network(
+        Polygon.from_bounds(west + 0.001, south + 0.001, east - 0.001, north - 0.001),
+        tile_cache,
+    )
+    assert len(downloaded_tiles) == 1
+    assert len(network.way_ids) == 1
+
+    network = request_tiled_road_network(
+        Polygon.from_bounds(west + 0.002, south + 0.001, east + 0.001, north - 0.001),
+        tile_cache,
+    )
+    assert len(downloaded_tiles) == 2
+    assert len(network.way_ids) == 2
+    # node 1 is shared by the two tiles
+    assert list(network.node_ids).count(1) == 1
+
+
+def test_request_tiled_road_network_offline_refuses_missing_tiles(monkeypatch, tmp_path):
+    def mock_request_road_network(polygon, stream=False):
+        raise AssertionError("nothing is downloaded offline")
+
+    monkeypatch.setattr(
+        jeddah.request_daedal, "request_road_network", mock_request_road_network
+    )
+    tile_cache = RoadTileCache(tmp_path)
+    tile_cache.save((8299, 5636), RoadNetworkBuilder(frozenset(["residential"])).build())
+    west, south, east, north = tile_polygon((8299, 5636)).bounds
+
+    network = request_tiled_road_network(
+        Polygon.from_bounds(west + 0.001, south + 0.001, east - 0.001, north - 0.001),
+        tile_cache,
+        offline=True,
+    )
+    assert len(network.way_ids) == 0
+    with pytest.raises(FileNotFoundError):
+        request_tiled_road_network(
+            Polygon.from_bounds(west + 0.001, south + 0.001, east + 0.001, north),
+            tile_cache,
+            offline=True,
+        )
+
+
+def test_iter_completed_paths_gives_the_same_paths_with_a_process_pool(monkeypatch):
+    monkeypatch.setattr(jeddah.request_daedal.settings, "path_processing_chunk_size", 3)
+    paths = {
+        path_id: [
+            Point(48.866972 + path_id * 1e-4, 2.356597),
+            Point(48.867252, 2.356781 + path_id * 1e-4),
+            Point(48.867724, 2.354896),
+        ]
+        for path_id in range(10)
+    }
+    paths[4] = []
+
+    sequential_paths = list(iter_completed_paths(paths.items(), threshold=10, workers=1))
+    parallel_paths = list(iter_completed_paths(paths.items(), threshold=10, workers=2))
+
+    assert [path_id for path_id, _ in parallel_paths] == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+    assert parallel_paths == sequential_paths
+
+
+def overpass_response(status_code, content=b""):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+def test_download_overpass_response_retries_overloaded_servers(monkeypatch, tmp_path):
+    content = b'{"elements": [{"type": "node", "id": 1}]}'
+    responses = [overpass_response(429), overpass_response(504)]
+    responses.append(overpass_response(200, content))
+    sleeps = []
+    monkeypatch.setattr(ox_settings, "cache_folder", str(tmp_path))
+    monkeypatch.setattr(requests, "post", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr("jeddah.request_daedal.time.sleep", sleeps.append)
+    monkeypatch.setattr(downloader, "_get_pause", lambda endpoint: 0)
+
+    response_path = download_overpass_response({"data": "query"})
+
+    assert response_path.read_bytes() == content
+    assert sleeps == [0, 60, 0, 60, 0]
+
+
+def test_download_overpass_response_does_not_cache_remarks(monkeypatch, tmp_path):
+    content = b'{"elements": [\n\n],\n"remark": "runtime error: Query timed out"\n}'
+    monkeypatch.setattr(ox_settings, "cache_folder", str(tmp_path))
+    monkeypatch.setattr(
+        requests, "post", lambda *args, **kwargs: overpass_response(200, content)
+    )
+    monkeypatch.setattr("jeddah.request_daedal.time.sleep", lambda seconds: None)
+    monkeypatch.setattr(downloader, "_get_pause", lambda endpoint: 0)
+
+    with pytest.raises(OverpassError, match="Query timed out"):
+        download_overpass_response({"data": "query"})
+    assert list(tmp_path.iterdir()) == []
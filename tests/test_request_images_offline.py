@@ -0,0 +1,237 @@
+import threading
+
+import pytest
+import requests
+
+import jeddah
+from jeddah.database_config import PathProgress, PendingImage
+from jeddah.image_cache import ImageCache
+from jeddah.point import Point
+from jeddah.request_images import (
+    MetadataError,
+    deduplicate_downloads,
+    download_image,
+    download_images,
+    get_images_along_path,
+    get_pano_id,
+    get_pano_ids,
+    side_image_downloads,
+)
+
+
+def test_download_images_writes_every_image_at_its_path(monkeypatch, tmp_path):
+    def mock_return(point, heading):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = f"{point}|{heading}".encode()
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+
+    downloads = []
+    for index in range(20):
+        point = Point(44.85 + index / 1000, -0.60)
+        downloads.extend(side_image_downloads(point, tmp_path, 10, index))
+    download_images(downloads, max_workers=4)
+
+    for point, heading, image_path in downloads:
+        assert image_path.read_bytes() == f"{point}|{heading}".encode()
+    assert (tmp_path / "image_point_19_-90.jpg").is_file()
+
+
+def test_get_pano_ids_returns_none_for_points_without_imagery(monkeypatch):
+    def mock_return(point):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        if point.latitude > 45:
+            mock_response._content = b'{"status": "ZERO_RESULTS"}'
+        else:
+            mock_response._content = b'{"status": "OK", "pano_id": "pano_1"}'
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_metadata", mock_return)
+
+    pano_ids = get_pano_ids([Point(44.85, -0.60), Point(46.0, -0.60)], max_workers=2)
+
+    assert pano_ids == ["pano_1", None]
+
+
+def test_get_pano_ids_requests_in_the_calling_thread_with_one_worker(monkeypatch):
+    threads = set()
+
+    def mock_return(point):
+        threads.add(threading.current_thread())
+        return "pano_1"
+
+    monkeypatch.setattr(jeddah.request_images, "get_pano_id", mock_return)
+
+    pano_ids = get_pano_ids([Point(44.85, -0.60), Point(46.0, -0.60)], max_workers=1)
+
+    assert pano_ids == ["pano_1", "pano_1"]
+    assert threads == {threading.current_thread()}
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b'{"status": "REQUEST_DENIED"}', b'{"status": "OVER_QUERY_LIMIT"}', b"<html>"],
+)
+def test_get_pano_id_raises_when_the_metadata_request_failed(monkeypatch, content):
+    def mock_return(point):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = content
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_metadata", mock_return)
+
+    with pytest.raises(MetadataError):
+        get_pano_id(Point(44.85, -0.60))
+
+
+def test_get_pano_id_raises_when_the_metadata_request_is_an_error(monkeypatch):
+    def mock_return(url, params):
+        mock_response = requests.Response()
+        mock_response.status_code = 500
+        mock_response._content = b'{"status": "ZERO_RESULTS"}'
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images.http_client, "get", mock_return)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        get_pano_id(Point(44.85, -0.60))
+
+
+def test_deduplicate_downloads_keeps_one_download_per_pano_and_heading(tmp_path):
+    points = [Point(44.851, -0.609), Point(44.852, -0.609), Point(44.853, -0.609)]
+    downloads_per_point = [
+        side_image_downloads(points[0], tmp_path, 10, 0),
+        side_image_downloads(points[1], tmp_path, 10, 1),
+        side_image_downloads(points[2], tmp_path, 10, 2),
+    ]
+
+    downloads_to_make, downloads_used_per_point = deduplicate_downloads(
+        downloads_per_point, ["pano_1", "pano_1", None]
+    )
+
+    assert downloads_to_make == downloads_per_point[0]
+    assert downloads_used_per_point == [
+        downloads_per_point[0],
+        downloads_per_point[0],
+        [],
+    ]
+
+
+def test_download_image_requests_each_image_once_with_the_cache(monkeypatch, tmp_path):
+    requested = []
+
+    def mock_return(point, heading):
+        requested.append((point, heading))
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response.headers["Content-Type"] = "image/jpeg"
+        mock_response._content = b"jpeg"
+        return mock_response
+
+    image_cache = ImageCache(tmp_path / "cache", max_bytes=1000)
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: image_cache)
+
+    point = Point(44.851332, -0.609030)
+    download_image((point, 90, tmp_path / "image_1.jpg"))
+    download_image((point, 90, tmp_path / "image_2.jpg"))
+
+    assert len(requested) == 1
+    assert (tmp_path / "image_2.jpg").read_bytes() == b"jpeg"
+    assert (image_cache.hits, image_cache.misses) == (1, 1)
+
+
+def test_get_images_along_path_records_downloads_by_batches(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    requested = []
+
+    def mock_return(point, heading):
+        requested.append((point, heading))
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = b"jpeg"
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    monkeypatch.setattr(
+        jeddah.request_images,
+        "get_pano_ids",
+        lambda path, max_workers=None: ["pano_1", "pano_2", None],
+    )
+    monkeypatch.setattr(jeddah.request_images.settings, "checkpoint_batch_size", 3)
+    database = checkpoint_database()
+    path = [Point(44.851, -0.609), Point(44.852, -0.609), Point(44.853, -0.609)]
+
+    id_path, failed = get_images_along_path(path, "test_project", database, tmp_path, "3")
+
+    assert (id_path, failed) == (3, 0)
+    path_row, point_rows, image_rows_per_point = database.ingested_paths[0]
+    assert (path_row["path_key"], path_row["completed"]) == ("3", False)
+    assert len(point_rows) == 3
+    assert all(not row["downloaded"] for rows in image_rows_per_point for row in rows)
+    assert [(id, len(batch)) for id, batch in database.downloaded_batches] == [
+        (3, 3),
+        (3, 1),
+    ]
+    assert len(requested) == 4
+
+
+def test_get_images_along_path_resumes_a_started_path(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    requested = []
+
+    def mock_return(point, heading):
+        requested.append((point, heading))
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = b"jpeg"
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    pending_image = PendingImage(44.852, -0.609, 100, str(tmp_path / "image.jpg"))
+    database = checkpoint_database(
+        progress={"3": PathProgress(5, False, [pending_image])}
+    )
+    path = [Point(44.851, -0.609), Point(44.852, -0.609), Point(44.853, -0.609)]
+
+    id_path, failed = get_images_along_path(path, "test_project", database, tmp_path, "3")
+
+    assert (id_path, failed) == (5, 0)
+    assert database.ingested_paths == []
+    assert requested == [(Point(44.852, -0.609), 100)]
+    assert database.downloaded_batches == [(5, [str(tmp_path / "image.jpg")])]
+    assert (tmp_path / "image.jpg").read_bytes() == b"jpeg"
+
+
+def test_get_images_along_path_does_not_write_nor_record_failed_images(
+    monkeypatch, tmp_path, checkpoint_database
+):
+    def mock_return(point, heading):
+        mock_response = requests.Response()
+        mock_response.status_code = 200 if heading == 100 else 429
+        mock_response._content = b"jpeg" if heading == 100 else b"quota exceeded"
+        mock_response._content_consumed = True
+        return mock_response
+
+    monkeypatch.setattr(jeddah.request_images, "get_single_image", mock_return)
+    monkeypatch.setattr(jeddah.request_images, "get_image_cache", lambda: None)
+    pending_images = [
+        PendingImage(44.852, -0.609, 100, str(tmp_path / "image_100.jpg")),
+        PendingImage(44.852, -0.609, -80, str(tmp_path / "image_-80.jpg")),
+    ]
+    database = checkpoint_database(progress={"3": PathProgress(5, False, pending_images)})
+    path = [Point(44.852, -0.609)]
+
+    _, failed = get_images_along_path(path, "test_project", database, tmp_path, "3")
+
+    assert failed == 1
+    assert database.downloaded_batches == [(5, [str(tmp_path / "image_100.jpg")])]
+    assert not (tmp_path / "image_-80.jpg").exists()
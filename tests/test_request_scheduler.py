@@ -0,0 +1,150 @@
+import pytest
+import requests
+
+from jeddah.request_scheduler import (
+    RequestBudgetExceeded,
+    RequestScheduler,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def response_with_status(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b""
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    return response
+
+
+def build_scheduler(send, clock, **kwargs):
+    return RequestScheduler(
+        send,
+        rates={"roads": 10},
+        endpoints={"https://roads/": "roads"},
+        burst=kwargs.pop("burst", 2),
+        backoff_base=kwargs.pop("backoff_base", 1),
+        backoff_max=kwargs.pop("backoff_max", 8),
+        clock=clock,
+        sleep=clock.sleep,
+        **kwargs,
+    )
+
+
+def test_token_bucket_lets_a_burst_through_then_spaces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=3, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3:] == pytest.approx([0.1, 0.1])
+    assert clock.now == pytest.approx(0.2)
+
+
+def test_token_bucket_refills_up_to_its_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=2, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+
+
+def test_get_retries_throttled_and_server_errors_with_backoff(monkeypatch):
+    clock = FakeClock()
+    statuses = [429, 503, 200]
+    monkeypatch.setattr("jeddah.request_scheduler.random.uniform", lambda a, b: b)
+
+    def send(url, params):
+        return response_with_status(statuses.pop(0))
+
+    scheduler = build_scheduler(send, clock, max_retries=4)
+    response = scheduler.get("https://roads/", {"path": "1,2"})
+
+    assert response.status_code == 200
+    # backoffs double from backoff_base, on top of the rate limit
+    assert [wait for wait in clock.sleeps if wait >= 1] == [1, 2]
+    metrics = scheduler.metrics()["roads"]
+    assert (metrics["requests"], metrics["retries"], metrics["throttled"]) == (3, 2, 1)
+    assert metrics["failed"] == 0
+    assert metrics["requests_per_second"] > 0
+
+
+def test_get_returns_the_error_once_retries_are_exhausted():
+    clock = FakeClock()
+    scheduler = build_scheduler(
+        lambda url, params: response_with_status(500), clock, max_retries=2
+    )
+    response = scheduler.get("https://roads/")
+    assert response.status_code == 500
+    metrics = scheduler.metrics()["roads"]
+    assert (metrics["requests"], metrics["retries"], metrics["failed"]) == (3, 2, 1)
+
+
+def test_get_does_not_retry_client_errors():
+    clock = FakeClock()
+    sent = []
+
+    def send(url, params):
+        sent.append(url)
+        return response_with_status(403)
+
+    scheduler = build_scheduler(send, clock, max_retries=2)
+    assert scheduler.get("https://roads/").status_code == 403
+    assert len(sent) == 1
+
+
+def test_get_retries_connection_errors_then_raises():
+    clock = FakeClock()
+
+    def send(url, params):
+        raise requests.exceptions.ConnectionError("refused")
+
+    scheduler = build_scheduler(send, clock, max_retries=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        scheduler.get("https://roads/")
+    assert scheduler.metrics()["roads"]["requests"] == 2
+
+
+def test_backoff_waits_at_least_the_retry_after_of_the_response():
+    scheduler = build_scheduler(lambda url, params: None, FakeClock())
+    response = response_with_status(429, {"Retry-After": "5"})
+    assert scheduler.backoff(0, response) >= 5
+    assert 0 <= scheduler.backoff(10) <= 8
+
+
+def test_get_does_not_rate_limit_unknown_endpoints():
+    clock = FakeClock()
+    scheduler = build_scheduler(lambda url, params: response_with_status(200), clock)
+    for _ in range(10):
+        scheduler.get("https://example.com/tiles")
+    assert clock.sleeps == []
+    assert scheduler.metrics()["example.com"]["requests"] == 10
+
+
+def test_get_stops_sending_once_the_budget_is_spent():
+    clock = FakeClock()
+    statuses = [429, 200, 200]
+
+    def send(url, params):
+        return response_with_status(statuses.pop(0))
+
+    scheduler = build_scheduler(send, clock, budget=3)
+    scheduler.get("https://roads/")
+    scheduler.get("https://roads/")
+    # the retry counted against the budget
+    with pytest.raises(RequestBudgetExceeded):
+        scheduler.get("https://roads/")
+    assert scheduler.sent == 3
@@ -0,0 +1,77 @@
+from jeddah.point import Point
+from jeddah.road_graph import RoadGraph, chain_key
+from jeddah.road_network import RoadNetworkBuilder
+
+
+def build_network(ways):
+    builder = RoadNetworkBuilder(frozenset(["residential"]))
+    for node_id in range(1, 10):
+        builder.add_element(
+            {"type": "node", "id": node_id, "lat": 48.86 + node_id / 1000, "lon": 2.35}
+        )
+    for way_id, node_ids in ways.items():
+        builder.add_element(
+            {
+                "type": "way",
+                "id": way_id,
+                "nodes": node_ids,
+                "tags": {"highway": "residential"},
+            }
+        )
+    return builder.build()
+
+
+def test_from_network_keeps_segments_shared_by_several_ways_once():
+    network = build_network({10: [1, 2, 3], 11: [3, 2, 1], 12: [2, 3, 4]})
+    road_graph = RoadGraph.from_network(network)
+    assert len(road_graph.edges) == 3
+
+
+def test_chains_merge_ways_between_intersections():
+    # 10 and 11 continue each other, 12 crosses them at node 3
+    network = build_network({10: [1, 2, 3], 11: [3, 4, 5], 12: [6, 3, 7]})
+    road_graph = RoadGraph.from_network(network)
+    node_ids = [network.node_ids[chain].tolist() for chain in road_graph.chains()]
+    assert sorted(node_ids) == [[1, 2, 3], [3, 4, 5], [3, 6], [3, 7]]
+
+    network = build_network({10: [1, 2, 3], 11: [3, 4, 5]})
+    road_graph = RoadGraph.from_network(network)
+    node_ids = [network.node_ids[chain].tolist() for chain in road_graph.chains()]
+    assert node_ids == [[1, 2, 3, 4, 5]]
+
+
+def test_chains_include_loops_without_intersection():
+    network = build_network({10: [1, 2, 3], 11: [3, 4, 1]})
+    road_graph = RoadGraph.from_network(network)
+    chains = road_graph.chains()
+    assert len(chains) == 1
+    assert len(chains[0]) == 5
+    assert chains[0][0] == chains[0][-1]
+
+
+def test_chain_paths_drop_segments_outside_of_the_mask():
+    network = build_network({10: [1, 2, 3, 4]})
+    node_mask = network.node_ids != 4
+    road_graph = RoadGraph.from_network(network, node_mask)
+    assert list(road_graph.chain_paths().values()) == [
+        [Point(48.861, 2.35), Point(48.862, 2.35), Point(48.863, 2.35)]
+    ]
+
+
+def test_chain_key_does_not_depend_on_the_walk():
+    assert chain_key([1, 2, 3]) == chain_key([3, 2, 1])
+    assert chain_key([4, 2, 3, 4]) == chain_key([2, 3, 4, 2]) == chain_key([3, 2, 4, 3])
+    assert chain_key([1, 2, 3]) != chain_key([1, 4, 3])
+
+
+def test_chain_paths_keep_their_keys_when_the_network_grows():
+    road_graph = RoadGraph.from_network(build_network({10: [4, 5, 6]}))
+    # the new chain comes first
+    grown_road_graph = RoadGraph.from_network(
+        build_network({10: [4, 5, 6], 11: [1, 2, 3], 12: [7, 8, 9]})
+    )
+    chains = road_graph.chain_paths()
+    grown_chains = grown_road_graph.chain_paths()
+    assert list(grown_chains)[0] != list(chains)[0]
+    assert len(grown_chains) == 3
+    assert {key: grown_chains[key] for key in chains} == chains
@@ -0,0 +1,227 @@
+import io
+import json
+from pathlib import Path
+import threading
+
+import numpy as np
+import pytest
+
+import jeddah
+from jeddah.point import Point
+from jeddah.road_network import (
+    FORMAT_VERSION,
+    RoadNetwork,
+    RoadNetworkBuilder,
+    iter_overpass_elements,
+)
+
+
+CACHE_DIRECTORY = Path(jeddah.__file__).parent / "cache"
+CACHE_FILE = CACHE_DIRECTORY / "06929bc4d24d34e905b77ee6c82834c99424428a.json"
+
+
+def nodes_and_paths(network):
+    """
+    :return: nodes as Point objects and ways as lists of node ids, keyed by OSM id
+    """
+    nodes = {
+        node_id: Point(latitude, longitude)
+        for node_id, latitude, longitude in zip(
+            network.node_ids.tolist(),
+            network.latitudes.tolist(),
+            network.longitudes.tolist(),
+        )
+    }
+    paths = {
+        way_id: network.node_ids[network.way_nodes(way_index)].tolist()
+        for way_index, way_id in enumerate(network.way_ids.tolist())
+    }
+    return nodes, paths
+
+
+def test_iter_overpass_elements_yields_the_same_elements_as_json_load(monkeypatch):
+    monkeypatch.setattr(jeddah.road_network, "CHUNK_SIZE", 100)
+    response_text = CACHE_FILE.read_text(encoding="utf-8")
+
+    elements = list(iter_overpass_elements(io.StringIO(response_text)))
+
+    assert elements == json.loads(response_text)["elements"]
+
+
+def test_iter_overpass_elements_handles_empty_element_lists():
+    response_text = '{"version": 0.6, "elements": [ ]}'
+    assert list(iter_overpass_elements(io.StringIO(response_text))) == []
+
+
+def test_build_keeps_only_nodes_used_by_accepted_ways():
+    builder = RoadNetworkBuilder(["tertiary"])
+    builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 40.41, "lon": -3.69},
+            {"type": "node", "id": 2, "lat": 40.42, "lon": -3.68},
+            {"type": "node", "id": 3, "lat": 40.43, "lon": -3.67},
+            {"type": "node", "id": 4, "lat": 40.44, "lon": -3.66},
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+            {"type": "way", "id": 11, "nodes": [3, 4], "tags": {"highway": "footway"}},
+            {"type": "way", "id": 12, "nodes": [2, 1], "tags": {"highway": "tertiary"}},
+        ]
+    )
+
+    network = builder.build()
+    nodes, paths = nodes_and_paths(network)
+
+    assert network.node_ids.tolist() == [1, 2]
+    assert nodes == {1: Point(40.41, -3.69), 2: Point(40.42, -3.68)}
+    assert paths == {10: [1, 2], 12: [2, 1]}
+
+
+def test_build_does_not_depend_on_the_order_of_elements():
+    builder = RoadNetworkBuilder(frozenset(["tertiary"]))
+    builder.add_elements(
+        [
+            {"type": "way", "id": 10, "nodes": [3, 1], "tags": {"highway": "tertiary"}},
+            {"type": "way", "id": 11, "nodes": [1, 2]},
+            {"type": "node", "id": 3, "lat": 40.43, "lon": -3.67},
+        ]
+    )
+    # a second response sending some elements again
+    builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 40.41, "lon": -3.69},
+            {"type": "node", "id": 3, "lat": 40.43, "lon": -3.67},
+            {"type": "way", "id": 10, "nodes": [3, 1], "tags": {"highway": "tertiary"}},
+        ]
+    )
+
+    network = builder.build()
+
+    assert network.way_ids.tolist() == [10]
+    assert network.way_points(0) == [Point(40.43, -3.67), Point(40.41, -3.69)]
+
+
+def test_build_drops_references_to_unknown_nodes():
+    builder = RoadNetworkBuilder(frozenset(["primary"]))
+    builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 40.41, "lon": -3.69},
+            {"type": "node", "id": 2, "lat": 40.42, "lon": -3.68},
+            {"type": "way", "id": 10, "nodes": [1, 5, 2], "tags": {"highway": "primary"}},
+            {"type": "way", "id": 11, "nodes": [7, 8], "tags": {"highway": "primary"}},
+        ]
+    )
+
+    nodes, paths = nodes_and_paths(builder.build())
+
+    assert paths == {10: [1, 2], 11: []}
+
+
+def test_save_and_load_give_back_the_same_network(tmp_path):
+    builder = RoadNetworkBuilder({"residential", "tertiary", "primary"})
+    builder.add_elements(json.loads(CACHE_FILE.read_text(encoding="utf-8"))["elements"])
+    network = builder.build()
+
+    network.save(tmp_path / "network")
+    loaded_network = RoadNetwork.load(tmp_path / "network")
+
+    assert nodes_and_paths(loaded_network) == nodes_and_paths(network)
+    assert isinstance(loaded_network.latitudes, np.memmap)
+    assert loaded_network.highway_types == network.highway_types
+    assert np.array_equal(loaded_network.way_highway_codes, network.way_highway_codes)
+    assert loaded_network.nbytes == network.nbytes
+
+
+def test_save_replaces_the_network_saved_before(tmp_path):
+    builder = RoadNetworkBuilder({"residential", "tertiary", "primary"})
+    builder.add_elements(json.loads(CACHE_FILE.read_text(encoding="utf-8"))["elements"])
+    builder.build().save(tmp_path / "network")
+    RoadNetworkBuilder({"tertiary"}).build().save(tmp_path / "network")
+
+    loaded_network = RoadNetwork.load(tmp_path / "network", mmap_mode=None)
+    assert len(loaded_network.way_ids) == 0
+    assert [path.name for path in tmp_path.iterdir()] == ["network"]
+
+
+def test_concurrent_saves_leave_a_single_complete_network(tmp_path):
+    builder = RoadNetworkBuilder({"residential", "tertiary", "primary"})
+    builder.add_elements(json.loads(CACHE_FILE.read_text(encoding="utf-8"))["elements"])
+    network = builder.build()
+    threads = [
+        threading.Thread(target=network.save, args=(tmp_path / "network",))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    loaded_network = RoadNetwork.load(tmp_path / "network", mmap_mode=None)
+    assert nodes_and_paths(loaded_network) == nodes_and_paths(network)
+    assert [path.name for path in tmp_path.iterdir()] == ["network"]
+
+
+def test_load_refuses_other_format_versions(tmp_path):
+    RoadNetworkBuilder({"tertiary"}).build().save(tmp_path / "network")
+    np.save(tmp_path / "network" / "format_version.npy", np.array(FORMAT_VERSION + 1))
+
+    with pytest.raises(ValueError):
+        RoadNetwork.load(tmp_path / "network")
+
+
+def test_build_encodes_highway_types():
+    builder = RoadNetworkBuilder({"residential", "tertiary"})
+    builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 40.41, "lon": -3.69},
+            {"type": "node", "id": 2, "lat": 40.42, "lon": -3.68},
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+            {
+                "type": "way",
+                "id": 11,
+                "nodes": [2, 1],
+                "tags": {"highway": "residential"},
+            },
+            {"type": "way", "id": 12, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+        ]
+    )
+    network = builder.build()
+
+    assert network.way_highway_codes.dtype == np.uint8
+    assert [network.way_highway_type(way_index) for way_index in range(3)] == [
+        "tertiary",
+        "residential",
+        "tertiary",
+    ]
+
+    merging_builder = RoadNetworkBuilder({"residential", "tertiary"})
+    merging_builder.highway_code("primary")
+    merging_builder.add_network(network)
+    merged_network = merging_builder.build()
+    assert merged_network.way_highway_type(1) == "residential"
+
+
+def test_add_network_merges_networks_sharing_elements():
+    first_builder = RoadNetworkBuilder(["tertiary"])
+    first_builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 40.41, "lon": -3.69},
+            {"type": "node", "id": 2, "lat": 40.42, "lon": -3.68},
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+        ]
+    )
+    second_builder = RoadNetworkBuilder(["tertiary"])
+    second_builder.add_elements(
+        [
+            {"type": "node", "id": 2, "lat": 40.42, "lon": -3.68},
+            {"type": "node", "id": 3, "lat": 40.43, "lon": -3.67},
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+            {"type": "way", "id": 11, "nodes": [2, 3], "tags": {"highway": "tertiary"}},
+        ]
+    )
+
+    builder = RoadNetworkBuilder(["tertiary"])
+    builder.add_network(first_builder.build())
+    builder.add_network(second_builder.build())
+    nodes, paths = nodes_and_paths(builder.build())
+
+    assert list(nodes) == [1, 2, 3]
+    assert paths == {10: [1, 2], 11: [2, 3]}
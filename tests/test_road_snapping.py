@@ -0,0 +1,99 @@
+import json
+
+import pytest
+import requests
+
+from jeddah import http_client
+from jeddah.point import Point
+from jeddah.point_array import PointArray
+from jeddah.road_snapping import (
+    WINDOW_OVERLAP,
+    WINDOW_SIZE,
+    SnapCache,
+    snap_path,
+    window_bounds,
+)
+
+
+def mock_roads_api(sent_paths):
+    """
+    Snaps every point onto itself and interpolates a point after each of them
+    """
+
+    def mock_return(link_base_for_api, params):
+        sent_paths.append(params["path"])
+        snapped_points = []
+        for index, coordinates in enumerate(params["path"].split("|")):
+            latitude, longitude = map(float, coordinates.split(","))
+            snapped_points.append(
+                {
+                    "location": {"latitude": latitude, "longitude": longitude},
+                    "originalIndex": index,
+                }
+            )
+            snapped_points.append(
+                {"location": {"latitude": latitude, "longitude": longitude + 1e-5}}
+            )
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = json.dumps({"snappedPoints": snapped_points}).encode()
+        return mock_response
+
+    return mock_return
+
+
+def test_window_bounds_cover_the_path_with_overlapping_windows():
+    assert window_bounds(WINDOW_SIZE) == [(0, WINDOW_SIZE)]
+
+    bounds = window_bounds(250)
+    assert bounds[0][0] == 0
+    assert bounds[-1][1] == 250
+    for (_, end), (next_start, _) in zip(bounds, bounds[1:]):
+        assert end - next_start == WINDOW_OVERLAP
+    assert all(end - start <= WINDOW_SIZE for start, end in bounds)
+
+
+def test_snap_path_stitches_windows_in_the_path_order(monkeypatch):
+    sent_paths = []
+    monkeypatch.setattr(http_client, "get", mock_roads_api(sent_paths))
+    path = PointArray([44.85 + index * 1e-4 for index in range(250)], [-0.6] * 250)
+
+    snapped_path = snap_path(path, max_workers=4)
+
+    assert len(sent_paths) == len(window_bounds(250))
+    assert all(len(sent_path.split("|")) <= WINDOW_SIZE for sent_path in sent_paths)
+    assert snapped_path[::2] == path
+    assert snapped_path[1::2] == PointArray(path.latitudes, path.longitudes + 1e-5)
+
+
+def test_snap_path_requests_cached_windows_once(monkeypatch, tmp_path):
+    sent_paths = []
+    monkeypatch.setattr(http_client, "get", mock_roads_api(sent_paths))
+    snap_cache = SnapCache(tmp_path)
+    path = PointArray([44.85 + index * 1e-4 for index in range(150)], [-0.6] * 150)
+
+    snapped_path = snap_path(path, snap_cache=snap_cache)
+    assert len(sent_paths) == 2
+    assert snap_path(path, snap_cache=snap_cache) == snapped_path
+    assert len(sent_paths) == 2
+
+
+@pytest.mark.parametrize(
+    "status_code, content",
+    [(400, b'{"error": {"code": 400}}'), (503, b'{"snappedPoints": []}')],
+)
+def test_snap_path_keeps_the_points_of_windows_that_failed(
+    monkeypatch, tmp_path, status_code, content
+):
+    def mock_return(link_base_for_api, params):
+        mock_response = requests.Response()
+        mock_response.status_code = status_code
+        mock_response._content = content
+        return mock_response
+
+    monkeypatch.setattr(http_client, "get", mock_return)
+    snap_cache = SnapCache(tmp_path)
+    path = [Point(44.851332, -0.609030), Point(44.850580, -0.606297)]
+
+    assert snap_path(path, snap_cache=snap_cache) == path
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,55 @@
+import math
+
+from shapely.geometry import box
+
+from jeddah.road_network import RoadNetworkBuilder
+from jeddah.road_tiles import RoadTileCache, tile_of, tile_polygon, tiles_covering
+
+from tests.test_road_network import nodes_and_paths
+
+
+def test_tile_of_returns_the_slippy_map_tile():
+    assert tile_of(48.8566, 2.3522) == (8299, 5636)
+    assert tile_of(0, 0, zoom=1) == (1, 1)
+
+
+def test_tile_polygon_contains_the_points_of_the_tile():
+    west, south, east, north = tile_polygon((8299, 5636)).bounds
+    assert west < 2.3522 < east
+    assert south < 48.8566 < north
+    assert math.isclose(east - west, 360 / 2**14)
+
+
+def test_tiles_covering_returns_every_tile_intersecting_the_polygon():
+    west, south, east, north = tile_polygon((8299, 5636)).bounds
+    polygon = box(west + 0.001, south + 0.001, east - 0.001, north - 0.001)
+    assert tiles_covering(polygon) == [(8299, 5636)]
+
+    polygon = box(west - 0.001, south + 0.001, east - 0.001, north + 0.001)
+    assert sorted(tiles_covering(polygon)) == [
+        (8298, 5635),
+        (8298, 5636),
+        (8299, 5635),
+        (8299, 5636),
+    ]
+
+
+def test_road_tile_cache_loads_saved_tiles_only(tmp_path):
+    builder = RoadNetworkBuilder(["tertiary"])
+    builder.add_elements(
+        [
+            {"type": "node", "id": 1, "lat": 48.851, "lon": 2.352},
+            {"type": "node", "id": 2, "lat": 48.852, "lon": 2.353},
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "tertiary"}},
+        ]
+    )
+    network = builder.build()
+    tile_cache = RoadTileCache(tmp_path)
+
+    assert tile_cache.load((8299, 5636)) is None
+    tile_cache.save((8299, 5636), network)
+
+    loaded_network = tile_cache.load((8299, 5636))
+    assert loaded_network is not None
+    assert nodes_and_paths(loaded_network) == nodes_and_paths(network)
+    assert tile_cache.load((8299, 5637)) is None
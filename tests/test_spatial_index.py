@@ -0,0 +1,59 @@
+import threading
+
+from jeddah.point import Point
+from jeddah.point_array import PointArray
+from jeddah.spatial_index import REQUESTS_PER_POINT, SpatialIndex, deduplicate_paths
+
+
+def test_add_path_drops_points_close_to_a_previous_path():
+    spatial_index = SpatialIndex(threshold=10)
+    first_path = [Point(48.8600, 2.3500), Point(48.8601, 2.3500)]
+    # about 3m and 50m away from the first path
+    second_path = [Point(48.86003, 2.3500), Point(48.8605, 2.3500)]
+
+    assert spatial_index.add_path(first_path) == first_path
+    assert spatial_index.add_path(second_path) == [Point(48.8605, 2.3500)]
+    assert spatial_index.kept == 3
+    assert spatial_index.dropped == 1
+    assert spatial_index.requests_saved == REQUESTS_PER_POINT
+
+
+def test_add_path_keeps_close_points_of_a_single_path():
+    spatial_index = SpatialIndex(threshold=10)
+    path = [Point(48.8600, 2.3500), Point(48.86003, 2.3500)]
+    assert spatial_index.add_path(path) == path
+
+
+def test_add_path_finds_close_points_in_neighbouring_cells():
+    spatial_index = SpatialIndex(threshold=10)
+    latitudes = [48.86 + step * 0.00002 for step in range(10)]
+    spatial_index.add_path(PointArray(latitudes, [2.35] * 10))
+    shifted_path = PointArray([latitude + 0.00001 for latitude in latitudes], [2.35] * 10)
+    assert len(spatial_index.add_path(shifted_path)) == 0
+
+
+def test_deduplicate_paths_removes_paths_left_empty():
+    crossroad = Point(48.86, 2.35)
+    paths = {
+        0: [crossroad, Point(48.8605, 2.35)],
+        1: [crossroad],
+        2: [crossroad, Point(48.86, 2.3505)],
+    }
+    assert dict(deduplicate_paths(paths.items(), threshold=10)) == {
+        0: PointArray.from_points(paths[0]),
+        2: PointArray.from_points([Point(48.86, 2.3505)]),
+    }
+
+
+def test_spatial_index_keeps_a_point_once_when_paths_are_added_concurrently():
+    spatial_index = SpatialIndex(10)
+    path = [Point(48.86, 2.35), Point(48.861, 2.35)]
+    threads = [
+        threading.Thread(target=spatial_index.add_path, args=(path,)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert spatial_index.kept == 2
+    assert spatial_index.dropped == 14
@@ -3,7 +3,7 @@ from typing import Dict, Union
 from osmnx import downloader, utils_geo
 
 from jeddah.conversion_functions import coords_as_path_str
-from jeddah.create_path import compute_distance_with_haversine, filling_missing_points
+from jeddah.create_path import compute_distance_with_haversine, resample_path
 from jeddah.display_map import get_map, get_map_w_paths, save_map_from_request
 from jeddah.point import Point
 from settings.settings import settings
@@ -88,7 +88,7 @@ def deadal_from_point(
 
         # filling each path
         if len(point_list) != 0:
-            point_list_filled = filling_missing_points(point_list, threshold=10)
+            point_list_filled = resample_path(point_list, threshold=10)
             # TODO replace threshold
             paths_filled[id] = point_list_filled
 